@@ -1,26 +1,115 @@
-from flask import Flask, render_template, request, redirect, flash, session, url_for
-import mysql.connector
-from flask_bcrypt import Bcrypt
+from flask import (Flask, render_template, request, redirect, flash, session, url_for, current_app, jsonify,
+                   Response, stream_with_context)
 from functools import wraps
-from datetime import datetime, timedelta
-from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_NAME, SECRET_KEY
+from datetime import date, datetime, timedelta
+import config
+from config import (MANIFEST_INLINE_LIMIT, CONNECTION_RESULTS, FARE_CALENDAR_DAYS, FARE_CALENDAR_MAX_DAYS,
+                    MAX_PARTY_SIZE)
+import db
+import metrics
+from db import get_db_connection, get_read_connection
+from pagination import fetch_page
+from catalog import AirportCatalog
+from connections import RouteGraph
+from fares import FareCalendar
+from snapshot import FlightSnapshots
+import flight_search
+import seats
+import holds
+import manifests
+import dashboards
+import sales
+import destinations
+import exports
+import schedule
+import fragments
+import passwords
+from passwords import hash_password, check_password
+from principal import current_principal, has_permission, load_principal, bump_permission_version
+import os
 import random
+import time
 
-# Initialize the Flask app and MySQL connection
+# Every route below is registered on this app; create_app() configures it and attaches the
+# per-process resources (connection pool, password hashing workers, caches)
 app = Flask(__name__)
-app.secret_key = SECRET_KEY
-bcrypt = Bcrypt(app)
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD,
-        database=MYSQL_NAME
-    )
+metrics.init_app(app)
+airport_catalog = AirportCatalog(config.AIRPORT_CACHE_TTL)
+schedule_version = schedule.ScheduleVersion(config.SCHEDULE_VERSION_TTL)
+schedule_cached = schedule.conditional_on(schedule_version)
+route_graph = RouteGraph(schedule_version, config.CONNECTION_MIN_MINUTES, config.CONNECTION_MAX_LAYOVER_HOURS)
+fare_calendar = FareCalendar(config.FARE_CACHE_TTL, config.FARE_CACHE_ROUTES)
+flight_snapshots = FlightSnapshots(schedule_version)
+
+# Build the app from config.py (each setting overridable from the environment) plus `overrides`.
+# Used by wsgi.py, `python app.py` and `flask --app "app:create_app()"`.
+def create_app(overrides=None):
+    app.config.from_object(config)
+    app.config.update(overrides or {})
+    airport_catalog.ttl = app.config['AIRPORT_CACHE_TTL']
+    schedule_version.ttl = app.config['SCHEDULE_VERSION_TTL']
+    fare_calendar.ttl = app.config['FARE_CACHE_TTL']
+    fare_calendar.max_routes = app.config['FARE_CACHE_ROUTES']
+    snapshot_dir = app.config['FLIGHT_SNAPSHOT_DIR']
+    if snapshot_dir is None:
+        snapshot_dir = os.path.join(app.instance_path, 'snapshots')
+    flight_snapshots.configure(snapshot_dir, app.config['MYSQL_HOST'], app.config['MYSQL_NAME'])
+    init_worker(app, warm_pool=not app.config['PRELOAD_APP'])
+    if app.config['WARM_UP']:
+        warm_up(app)
+    return app
+
+# Resources that belong to one process. A pre-fork server calls this again in each worker
+# (gunicorn.conf.py post_fork), since sockets, locks and threads cannot be shared across a fork.
+def init_worker(app, warm_pool=True):
+    metrics.init_worker(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    db.init_app(app, host=app.config['MYSQL_HOST'], user=app.config['MYSQL_USER'],
+                password=app.config['MYSQL_PASSWORD'], database=app.config['MYSQL_NAME'],
+                size=app.config['DB_POOL_SIZE'], timeout=app.config['DB_POOL_TIMEOUT'],
+                ping_after=app.config['DB_POOL_PING_AFTER'], slow_query_ms=app.config['SLOW_QUERY_MS'],
+                replicas=app.config['MYSQL_REPLICAS'], replica_max_lag=app.config['REPLICA_MAX_LAG'],
+                replica_check_interval=app.config['REPLICA_CHECK_INTERVAL'])
+    passwords.init_app(app, rounds=app.config['PASSWORD_HASH_ROUNDS'], workers=app.config['PASSWORD_HASH_WORKERS'],
+                       max_queue=app.config['PASSWORD_HASH_QUEUE'], timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    fragments.init_app(app, max_chars=app.config['FRAGMENT_CACHE_MB'] * 1024 * 1024)
+    holds.init_app(app, interval=app.config['SEAT_HOLD_SWEEP_INTERVAL'], batch_size=app.config['SEAT_HOLD_SWEEP_BATCH'],
+                   on_release=fare_calendar.record_release)
+    if warm_pool and app.config['WARM_UP']:
+        try:
+            app.extensions['db_pool'].warm(app.config['DB_POOL_WARM'])
+        except Exception:
+            app.logger.exception('Could not open connections ahead of traffic, they will open on demand')
+
+# Compile every template, load the cached airport lists and schedule version and map (or export)
+# the flight snapshot, so the first requests a worker takes do not pay for it. A database outage
+# here is logged, not fatal.
+def warm_up(app):
+    started = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        try:
+            airport_catalog.get()
+            schedule_version.get()
+            route_graph.refresh()
+        except Exception:
+            app.logger.exception('Cache warm-up failed, caches will load on first use')
+    if flight_snapshots.path:
+        flight_snapshots.refresh(app)
+    app.logger.info('Warm-up finished in %.1f ms', (time.perf_counter() - started) * 1000)
 
 ####################################################################################################
 
+# Pool exhausted: tell the client to retry instead of failing with a 500
+@app.errorhandler(db.PoolTimeout)
+def handle_pool_timeout(e):
+    return 'The service is busy, please try again shortly.', 503
+
+# Password hashing queue full during a login/signup spike
+@app.errorhandler(passwords.HasherBusy)
+def handle_hasher_busy(e):
+    return 'The service is busy, please try again shortly.', 503
+
 # Define Login Required
 def login_required(f):
     @wraps(f)
@@ -32,24 +121,72 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Operational endpoints: airline staff only, unless OPS_ENDPOINTS_PUBLIC opens them (e.g. to a
+# metrics scraper on a private network)
+def ops_endpoint(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config['OPS_ENDPOINTS_PUBLIC'] and session.get('role') != 'airline_staff':
+            return 'You do not have permission to access this page.', 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Columns shown in flight listings, and the keyset they are paged by
+FLIGHT_LIST_SELECT = """
+    SELECT airline_name, flight_num, departure_airport, arrival_airport,
+           departure_time, arrival_time, price, status
+    FROM flight
+"""
+FLIGHT_LIST_KEY = ('departure_time', 'airline_name', 'flight_num')
+
 # Homepage
 @app.route('/')
+@schedule_cached
 def home():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("SELECT * FROM flight")
-    flights = cursor.fetchall()
-
-    cursor.execute("SELECT DISTINCT departure_airport FROM flight")
-    departure_airports = cursor.fetchall()
-
-    cursor.execute("SELECT DISTINCT arrival_airport FROM flight")
-    arrival_airports = cursor.fetchall()
+    after = request.args.get('after')
+    flights, next_cursor = fetch_page(cursor, FLIGHT_LIST_SELECT, [], [], FLIGHT_LIST_KEY,
+                                      after=after, limit=request.args.get('limit'))
 
     cursor.close()
     conn.close()
-    return render_template('home.html', flights=flights, departure_airports=departure_airports, arrival_airports=arrival_airports)
+
+    departure_airports, arrival_airports = airport_catalog.get()
+    return render_template('home.html', flights=flights, departure_airports=departure_airports, arrival_airports=arrival_airports,
+                           next_cursor=next_cursor, is_first_page=not after)
+
+# Flight listing API, one keyset page at a time (?after=<cursor>&limit=<n>)
+@app.route('/api/flights')
+@schedule_cached
+def api_flights():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        flights, next_cursor = fetch_page(cursor, FLIGHT_LIST_SELECT, [], [], FLIGHT_LIST_KEY,
+                                          after=request.args.get('after'), limit=request.args.get('limit'))
+    finally:
+        cursor.close()
+        conn.close()
+    return jsonify(flights=flights, next=next_cursor)
+
+# Fare calendar for a route: lowest fare, seats left and flight count for each day from
+# date - days to date + days (?source=JFK&destination=PVG&date=2024-10-10&days=3)
+@app.route('/api/fare_calendar')
+def api_fare_calendar():
+    source = request.args.get('source')
+    destination = request.args.get('destination')
+    if not source or not destination:
+        return jsonify(error='source, destination and date are required.'), 400
+    try:
+        day = date.fromisoformat(request.args.get('date', ''))
+        days = min(max(int(request.args.get('days', FARE_CALENDAR_DAYS)), 0), FARE_CALENDAR_MAX_DAYS)
+    except ValueError:
+        return jsonify(error='date must be in YYYY-MM-DD format and days a number.'), 400
+
+    calendar = fare_calendar.get(source, destination, day - timedelta(days=days), day + timedelta(days=days))
+    return jsonify(source=source, destination=destination, days=calendar)
 
 # Test to see if the database connection is working
 @app.route('/test')
@@ -63,16 +200,36 @@ def test():
     # return {"tables": tables}
     return {"tables": [table[0] for table in tables]}
 
-# Test feature to show flight Details
+# Connection pool usage (open, in use, waiters, checkout latency)
+@app.route('/pool_stats')
+@ops_endpoint
+def pool_stats():
+    stats = current_app.extensions['db_pool'].stats()
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is not None:
+        stats['replicas'] = replicas.stats()
+    return stats
+
+# Per-route latency, query count and DB time histograms in Prometheus text format
+@app.route('/metrics')
+@ops_endpoint
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Test feature to show flight Details (from the flight snapshot while it is current)
 @app.route('/flights/<int:flight_num>')
+@schedule_cached
 def flight_details(flight_num):
-
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM flight WHERE flight_num = %s", (flight_num,))
-    flight = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    snapshot = flight_snapshots.current()
+    if snapshot is not None:
+        flight = snapshot.find(flight_num)
+    else:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM flight WHERE flight_num = %s", (flight_num,))
+        flight = cursor.fetchone()
+        cursor.close()
+        conn.close()
     
     if flight is None:
         flash("Flight not found.")
@@ -80,66 +237,57 @@ def flight_details(flight_num):
     
     return render_template('flight_details.html', flight=flight)
 
-# Search Flights
+# Search Flights (add ?format=json for a JSON response). Direct flights come from the flight
+# snapshot, or MySQL while it is being re-exported; 1- and 2-stop connections from the
+# in-memory route graph, ranked by ?sort=duration (default) or price.
 @app.route('/search', methods=['GET'])
+@schedule_cached
 def search_flights():
     source = request.args.get('source')
     destination = request.args.get('destination')
     date = request.args.get('date')
+    as_json = request.args.get('format') == 'json'
+    sort = 'price' if request.args.get('sort') == 'price' else 'duration'
 
     # Error handling for missing fields
     if not source or not destination or not date:
+        if as_json:
+            return jsonify(error='source, destination and date are required.'), 400
         flash('All fields are required to search flights.', 'danger')
         return redirect(url_for('home'))
 
     # Get the logged-in user's email (if any)
     user_email = session.get('user_email')
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     try:
-        if user_email:
-            # Check if the user is a booking agent
-            cursor.execute("SELECT airline_name FROM booking_agent_work_for WHERE email = %s", (user_email,))
-            booking_agent = cursor.fetchone()
-
-            if booking_agent:
-                # Booking agent can only see flights from their airline
-                airline_name = booking_agent['airline_name']
-                query = """
-                    SELECT * FROM flight
-                    WHERE departure_airport = %s 
-                      AND arrival_airport = %s 
-                      AND DATE(departure_time) = %s
-                      AND airline_name = %s
-                """
-                cursor.execute(query, (source, destination, date, airline_name))
-            else:
-                # Customers can see flights from all airlines
-                query = """
-                    SELECT * FROM flight
-                    WHERE departure_airport = %s 
-                      AND arrival_airport = %s 
-                      AND DATE(departure_time) = %s
-                """
-                cursor.execute(query, (source, destination, date))
+        # Booking agents can only see flights from their airline; customers and guests see all airlines
+        airline_name = None
+        if user_email and session.get('role') == 'booking_agent':
+            airline_name = current_principal()['airline_name']
+
+        snapshot = flight_snapshots.current()
+        if snapshot is not None:
+            flights = snapshot.search(source, destination, date, airline_name)
         else:
-            # Non-logged-in users can see flights from all airlines
-            query = """
-                SELECT * FROM flight
-                WHERE departure_airport = %s 
-                  AND arrival_airport = %s 
-                  AND DATE(departure_time) = %s
-            """
-            cursor.execute(query, (source, destination, date))
-
-        flights = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            try:
+                flights = flight_search.search_flights(cursor, source, destination, date, airline_name)
+            finally:
+                cursor.close()
+                conn.close()
+        connections = route_graph.search(source, destination, date, min_stops=1, max_stops=2, sort=sort,
+                                         limit=CONNECTION_RESULTS, airline_name=airline_name)
+    except ValueError:
+        if as_json:
+            return jsonify(error='date must be in YYYY-MM-DD format.'), 400
+        flash('Invalid date. Please use YYYY-MM-DD.', 'danger')
+        return redirect(url_for('home'))
 
-    return render_template('search_results.html', flights=flights, search_failed=(len(flights) == 0))
+    if as_json:
+        return jsonify(flights=[dict(flight) for flight in flights], connections=connections)
+    return render_template('search_results.html', flights=flights, connections=connections, sort=sort,
+                           search_failed=(len(flights) == 0 and len(connections) == 0))
 
 # Signup
 @app.route('/signup', methods=['GET', 'POST'])
@@ -147,7 +295,6 @@ def signup():
     if request.method == 'POST':
         role = request.form['role']
         email = request.form['email']
-        password = bcrypt.generate_password_hash(request.form['password']).decode('utf-8')
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -175,6 +322,9 @@ def signup():
                 flash('Invalid airline name. Please choose a valid airline.', 'danger')
                 return redirect(url_for('signup'))
 
+        # Hash only once the checks have passed, bcrypt is the expensive part of signing up
+        password = hash_password(request.form['password'])
+
         # If role is customer, save the data in the customer table
         if role == 'customer':
             name = request.form['name']
@@ -244,10 +394,14 @@ def login():
             cursor.execute("SELECT * FROM airline_staff WHERE username = %s", (email,))
         user = cursor.fetchone()
 
-        cursor.close()
-        conn.close()
+        if user and check_password(user['password'], password):
+            # Upgrade hashes made with an older work factor while we have the plain password
+            if passwords.needs_rehash(user['password']):
+                table, key = ('airline_staff', 'username') if role == 'airline_staff' else (role, 'email')
+                cursor.execute(f"UPDATE {table} SET password = %s WHERE {key} = %s",
+                               (hash_password(password), user[key]))
+                conn.commit()
 
-        if user and bcrypt.check_password_hash(user['password'], password):
             # Set session variables
             session['role'] = role
             session['user_email'] = user['email'] if role != 'airline_staff' else user['username']
@@ -256,6 +410,11 @@ def login():
             if role == 'airline_staff':
                 session['airline_name'] = user['airline_name']
 
+            # Cache the user's airline, agent id and permissions for the rest of the session
+            session['principal'] = load_principal(cursor, role, session['user_email'])
+            cursor.close()
+            conn.close()
+
             flash(f'Logged in as {role.capitalize()}!', 'success')
 
             # Redirect based on user role
@@ -266,6 +425,8 @@ def login():
             elif role == 'airline_staff':
                 return redirect(url_for('airline_staff_dashboard'))
         else:
+            cursor.close()
+            conn.close()
             flash('Invalid login credentials. Please try again.', 'danger')
     
     return render_template('login.html')
@@ -276,6 +437,8 @@ def logout():
     # session.clear()
     session.pop('user_email', None)
     session.pop('role', None)
+    session.pop('airline_name', None)
+    session.pop('principal', None)
     flash('You have been logged out.', 'success')
     return redirect(url_for('login'))  # Redirects directly to login page
 
@@ -292,112 +455,30 @@ def customer_dashboard():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    try: 
-        cursor.execute("SELECT DISTINCT departure_airport FROM flight")
-        departure_airports = cursor.fetchall()
-
-        cursor.execute("SELECT DISTINCT arrival_airport FROM flight")
-        arrival_airports = cursor.fetchall()
-
-        cursor.execute("SELECT * FROM customer WHERE email = %s", (user_email,))
-        customer_info = cursor.fetchone()
-
-        # Fetch data for total spending in the last year and last 6 months
-        cursor.execute("""
-            SELECT DATE_FORMAT(p.purchase_date, '%Y-%m') AS month, 
-                   SUM(f.price) AS total_spent
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num
-            WHERE p.customer_email = %s AND p.purchase_date >= CURDATE() - INTERVAL 6 MONTH
-            GROUP BY month
-            ORDER BY month;
-        """, (user_email,))
-        last_six_months_spending = cursor.fetchall()
-
-        cursor.execute("""
-            SELECT SUM(f.price) AS total_spent
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num
-            WHERE p.customer_email = %s AND p.purchase_date >= CURDATE() - INTERVAL 1 YEAR;
-        """, (user_email,))
-        total_spent_last_year = cursor.fetchone()['total_spent'] or 0
-
-        total_spent_last_six_months = sum(entry['total_spent'] or 0 for entry in last_six_months_spending)
-
-        # Handle POST request for custom date range
-        start_date, end_date = None, None
-        monthly_spending = []
-        total_spent_range = 0
-
-        # Handle POST request for custom date range
-        start_date, end_date = None, None
-        monthly_spending = []
-        total_spent_range = 0
-
-        if request.method == 'POST':
-            start_date = request.form['start_date']
-            end_date = request.form['end_date']
-            cursor.execute("""
-                SELECT DATE_FORMAT(p.purchase_date, '%Y-%m') AS month,
-                       SUM(f.price) AS total_spent
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON t.flight_num = f.flight_num
-                WHERE p.customer_email = %s AND p.purchase_date BETWEEN %s AND %s
-                GROUP BY month
-                ORDER BY month;
-            """, (user_email, start_date, end_date))
-            monthly_spending = cursor.fetchall()
-            total_spent_range = sum(entry['total_spent'] or 0 for entry in monthly_spending)
-
-        ############################
+    # Custom date range for the spending chart
+    start_date, end_date = None, None
+    if request.method == 'POST':
+        start_date = request.form['start_date']
+        end_date = request.form['end_date']
 
-        # Get customer information
-        cursor.execute("SELECT * FROM customer WHERE email = %s", (user_email,))
-        customer_info = cursor.fetchone()
+    history_after = request.args.get('history_after')
+    departure_airports, arrival_airports = airport_catalog.get()
 
-        # Get upcoming flights for the customer
-        cursor.execute("""
-            SELECT f.airline_name, f.flight_num, f.departure_time, f.arrival_time, f.departure_airport, 
-                       f.arrival_airport, f.status, p.purchase_date, f.price
-            FROM flight f
-            JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
-            JOIN purchases p ON t.ticket_id = p.ticket_id
-            WHERE p.customer_email = %s AND f.status = 'upcoming'
-        """, (user_email,))
-        # SELECT flight_num FROM flight WHERE departure_time >= NOW()
-        upcoming_flights = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor(dictionary=True)
 
-        # Get booking history
-        cursor.execute("""
-            SELECT f.airline_name, f.flight_num, f.departure_time, f.arrival_time, f.departure_airport, 
-                       f.arrival_airport, f.status, p.purchase_date, f.price
-            FROM flight f
-            JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
-            JOIN purchases p ON t.ticket_id = p.ticket_id
-            WHERE p.customer_email = %s AND f.status != 'upcoming'
-        """, (user_email,))     
-        # SELECT flight_num FROM flight WHERE departure_time < NOW()
-        booking_history = cursor.fetchall()
+    try: 
+        dashboard = dashboards.load_customer_dashboard(cursor, user_email, history_after, start_date, end_date)
     finally: 
         cursor.close()
         conn.close()
 
     return render_template('customer_dashboard.html', 
-                           user_email=user_email, customer_info=customer_info, 
-                           upcoming_flights=upcoming_flights, booking_history=booking_history, 
+                           user_email=user_email,
                            departure_airports=departure_airports, arrival_airports=arrival_airports,
-                           total_spent_last_six_months=total_spent_last_six_months,
-                           total_spent_last_year=total_spent_last_year,
-                           last_six_months_spending=last_six_months_spending,
-                           monthly_spending=monthly_spending,
-                           total_spent_range=total_spent_range,
-                           start_date=start_date, end_date=end_date)
+                           history_is_first_page=not history_after,
+                           start_date=start_date, end_date=end_date,
+                           **dashboard)
 
 # Customer Profile
 @app.route('/profile')
@@ -426,41 +507,44 @@ def profile():
         conn.close()
     return render_template('profile.html', user_details=user_details)
 
-# Customer Purchase Tickets
+# Customer Purchase Tickets (optional `quantity` books a party of up to MAX_PARTY_SIZE seats)
 @app.route('/purchase_ticket', methods=['POST'])
 @login_required
 def purchase_ticket():
-    flight_num = request.form['flight_num']  # Passed from the form
+    airline_name = request.form['airline_name']  # Passed from the form
+    flight_num = request.form['flight_num']
     user_email = session['user_email']
 
+    try:
+        quantity = seats.party_size(request.form.get('quantity'), MAX_PARTY_SIZE)
+    except ValueError:
+        flash(f"You can book between 1 and {MAX_PARTY_SIZE} seats at a time.", "danger")
+        return redirect(url_for('customer_dashboard'))
+
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
     try:
-        # Find an available ticket for the selected flight
-        query = """
-            SELECT t.ticket_id 
-            FROM ticket t
-            LEFT JOIN purchases p ON t.ticket_id = p.ticket_id
-            WHERE t.flight_num = %s AND p.ticket_id IS NULL
-            LIMIT 1;
-        """
-        cursor.execute(query, (flight_num,))
-        available_ticket = cursor.fetchone()
+        # Claim all the seats for the selected flight at once, or none of them
+        ticket_ids = seats.allocate_seats(cursor, airline_name, flight_num, quantity)
 
-        if not available_ticket:
-            flash("No tickets are available for this flight.", "danger")
+        if ticket_ids is None:
+            conn.rollback()
+            if quantity == 1:
+                flash("No tickets are available for this flight.", "danger")
+            else:
+                flash(f"Fewer than {quantity} tickets are available for this flight.", "danger")
             return redirect(url_for('customer_dashboard'))
 
-        # Reserve the ticket and log the purchase
-        ticket_id = available_ticket['ticket_id']
-        purchase_query = """
-            INSERT INTO purchases (ticket_id, customer_email, purchase_date)
-            VALUES (%s, %s, CURDATE());
-        """
-        cursor.execute(purchase_query, (ticket_id, user_email))
+        # Log the purchases in the same transaction that took the seats
+        seats.insert_purchases(cursor, ticket_ids, user_email)
+        sales.record_sale(cursor, airline_name, flight_num, via_agent=False, tickets=quantity)
+        destinations.record_tickets(cursor, airline_name, flight_num, tickets=quantity)
+        fragments.bump(cursor, f'customer:{user_email}', f'airline:{airline_name}')
         conn.commit()
-        flash("Ticket purchased successfully!", "success")
+        fare_calendar.record_sale(airline_name, flight_num, tickets=quantity)
+        flash("Ticket purchased successfully!" if quantity == 1 else f"{quantity} tickets purchased successfully!",
+              "success")
         return redirect(url_for('customer_dashboard'))
 
     except Exception as e:
@@ -505,47 +589,35 @@ def track_spending():
 @app.route('/booking_agent_dashboard', methods=['GET', 'POST'])
 @login_required
 def booking_agent_dashboard():
-    user_email = session['user_email']
     role = session.get('role')
 
     if role != 'booking_agent':
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     # Get the booking agent ID based on the logged-in agent's email
-    cursor.execute("SELECT booking_agent_id FROM booking_agent WHERE email = %s", (user_email,))
-    booking_agent = cursor.fetchone()
-    if not booking_agent:
+    principal = current_principal()
+    booking_agent_id = principal['booking_agent_id']
+    if booking_agent_id is None:
         flash('Booking agent ID not found. Please contact support.', 'danger')
         return redirect(url_for('home'))
-    booking_agent_id = booking_agent['booking_agent_id']
+
+    conn = get_read_connection()
+    cursor = conn.cursor(dictionary=True)
     # Get the date 30 days ago
     thirty_days_ago = datetime.now() - timedelta(days=30)
     thirty_days_ago_str = thirty_days_ago.strftime('%Y-%m-%d')
 
     try:
-        cursor.execute("SELECT DISTINCT departure_airport FROM flight")
-        departure_airports = cursor.fetchall()
+        departure_airports, arrival_airports = airport_catalog.get()
 
-        cursor.execute("SELECT DISTINCT arrival_airport FROM flight")
-        arrival_airports = cursor.fetchall()
+        # The airline associated with the booking agent
+        airline_name = principal['airline_name']
 
-        # Retrieve the airline associated with the booking agent from booking_agent_work_for
-        cursor.execute("""
-            SELECT airline_name FROM booking_agent_work_for 
-            WHERE email = %s
-        """, (user_email,))
-        agent_airline = cursor.fetchone()
-
-        if not agent_airline:
+        if not airline_name:
             flash('No airline association found for this booking agent.', 'danger')
             return redirect(url_for('home'))
 
-        airline_name = agent_airline['airline_name']
-
         # Fetch upcoming flights booked for customers by this booking agent's airline
         cursor.execute("""
             SELECT f.airline_name, f.flight_num, f.departure_time, f.arrival_time, 
@@ -640,7 +712,7 @@ def booking_agent_dashboard():
         cursor.close()
         conn.close()
 
-    return render_template('booking_agent_dashboard.html', upcoming_flights=upcoming_flights,
+    return render_template('booking_agent_dashboard.html', airline_name=airline_name, upcoming_flights=upcoming_flights,
                             departure_airports=departure_airports, arrival_airports=arrival_airports,
                             total_commission=total_commission,
                             total_tickets_sold=total_tickets_sold,
@@ -655,7 +727,6 @@ def booking_agent_dashboard():
 @login_required
 @app.route('/agent_search_flights', methods=['GET', 'POST'])
 def agent_search_flights():
-    user_email = session['user_email']
     role = session['role']
 
     # Initialize variables for GET request (to prevent None values)
@@ -679,15 +750,12 @@ def agent_search_flights():
 
     try:
         # Get the airline associated with the booking agent
-        cursor.execute("SELECT airline_name FROM booking_agent_work_for WHERE email = %s", (user_email,))
-        booking_agent = cursor.fetchone()
+        airline_name = current_principal()['airline_name']
 
-        if not booking_agent:
+        if not airline_name:
             flash('No airline association found for this booking agent.', 'danger')
             return redirect(url_for('home'))
 
-        airline_name = booking_agent['airline_name']
-
         # Validate input fields only for POST request (not GET)
         if request.method == 'POST' and (not source or not destination or not date):
             flash('All fields are required to search flights.', 'danger')
@@ -698,15 +766,9 @@ def agent_search_flights():
                                    search_failed=True)
 
         # Search flights restricted to the booking agent's airline
-        query = """
-            SELECT * FROM flight
-            WHERE departure_airport = %s 
-                AND arrival_airport = %s 
-                AND DATE(departure_time) = %s
-                AND airline_name = %s
-        """
-        cursor.execute(query, (source, destination, date, airline_name))
-        flights = cursor.fetchall()
+        flights = []
+        if source and destination and date:
+            flights = flight_search.search_flights(cursor, source, destination, date, airline_name)
 
     except Exception as e:
         flash(f"An error occurred: {e}", 'danger')
@@ -739,85 +801,215 @@ def agent_purchase_ticket():
     cursor = conn.cursor(dictionary=True)  # Using dictionary=True for consistent fetches
 
     try:
-        print(f"Agent Purchase Ticket - User Email: {user_email}, Role: {role}")
+        # Get the booking agent ID and airline from the session's principal
+        principal = current_principal()
+        booking_agent_id = principal['booking_agent_id']
 
-        # Get the booking agent ID based on the logged-in agent's email
-        cursor.execute("SELECT booking_agent_id FROM booking_agent WHERE email = %s", (user_email,))
-        booking_agent = cursor.fetchone()
-        print(f"Booking Agent ID Query Result: {booking_agent}")
-
-        if not booking_agent:
+        if booking_agent_id is None:
             flash('Booking agent ID not found. Please contact support.', 'danger')
             return redirect(url_for('agent_search_flights'))
 
-        booking_agent_id = booking_agent['booking_agent_id']
-        print(f"Booking Agent ID: {booking_agent_id}")
+        airline_name = principal['airline_name']
 
-        # Get the airline associated with the booking agent
-        cursor.execute("SELECT airline_name FROM booking_agent_work_for WHERE email = %s", (user_email,))
-        agent_airline = cursor.fetchone()
-        print(f"Agent Airline Query Result: {agent_airline}")
-
-        if not agent_airline:
+        if not airline_name:
             flash('No airline association found for this booking agent.', 'danger')
             return redirect(url_for('agent_search_flights'))
-
-        airline_name = agent_airline['airline_name']
         flight_num = request.form['flight_num']
         customer_email = request.form['customer_email']
 
-        print(f"Flight Number: {flight_num}, Customer Email: {customer_email}, Airline Name: {airline_name}")
-
-        # Find an available ticket for the flight
-        query = """
-            SELECT t.ticket_id 
-            FROM ticket t
-            LEFT JOIN purchases p ON t.ticket_id = p.ticket_id
-            WHERE t.flight_num = %s AND p.ticket_id IS NULL
-            LIMIT 1;
-        """
-        cursor.execute(query, (flight_num,))
-        ticket = cursor.fetchone()
-        print(f"Available Ticket Query Result: {ticket}")
-
-        if not ticket:
-            flash('No available tickets for this flight.', 'danger')
+        try:
+            quantity = seats.party_size(request.form.get('quantity'), MAX_PARTY_SIZE)
+        except ValueError:
+            flash(f'You can book between 1 and {MAX_PARTY_SIZE} seats at a time.', 'danger')
             return redirect(url_for('agent_search_flights'))
 
-        ticket_id = ticket['ticket_id']
-        print(f"Selected Ticket ID: {ticket_id}")
-
         # Ensure the customer exists
-        cursor.execute("SELECT * FROM customer WHERE email = %s", (customer_email,))
+        cursor.execute("SELECT email FROM customer WHERE email = %s", (customer_email,))
         customer = cursor.fetchone()
-        print(f"Customer Query Result: {customer}")
 
         if not customer:
             flash('Customer email not found. Please check the email and try again.', 'danger')
             return redirect(url_for('agent_search_flights'))
 
-        # Insert the purchase record
-        print(f"Attempting to Insert: ticket_id={ticket_id}, customer_email={customer_email}, booking_agent_id={booking_agent_id}")
-        cursor.execute("""
-            INSERT INTO purchases (ticket_id, customer_email, booking_agent_id, purchase_date)
-            VALUES (%s, %s, %s, CURDATE());
-        """, (ticket_id, customer_email, booking_agent_id))
+        # Claim all the seats for the flight at once, or none of them
+        ticket_ids = seats.allocate_seats(cursor, airline_name, flight_num, quantity)
+
+        if ticket_ids is None:
+            conn.rollback()
+            flash('No available tickets for this flight.' if quantity == 1
+                  else f'Fewer than {quantity} tickets are available for this flight.', 'danger')
+            return redirect(url_for('agent_search_flights'))
+
+        # Insert the purchase records
+        seats.insert_purchases(cursor, ticket_ids, customer_email, booking_agent_id)
+        sales.record_sale(cursor, airline_name, flight_num, via_agent=True, tickets=quantity)
+        sales.record_agent_sale(cursor, airline_name, flight_num, booking_agent_id, tickets=quantity)
+        destinations.record_tickets(cursor, airline_name, flight_num, tickets=quantity)
+        fragments.bump(cursor, f'customer:{customer_email}', f'airline:{airline_name}')
         conn.commit()
-        print("Purchase record inserted successfully.")
+        fare_calendar.record_sale(airline_name, flight_num, tickets=quantity)
+        app.logger.info('Agent %s booked tickets %s on %s %s', booking_agent_id, ticket_ids, airline_name, flight_num)
 
-        flash('Flight successfully booked for customer!', 'success')
+        flash('Flight successfully booked for customer!' if quantity == 1
+              else f'{quantity} seats successfully booked for customer!', 'success')
         return redirect(url_for('booking_agent_dashboard'))
 
     except Exception as e:
         conn.rollback()
         flash(f'Error booking flight: {e}', 'danger')
-        print(f"Exception occurred: {e}")
+        app.logger.exception('Agent purchase failed for %s', user_email)
         return redirect(url_for('booking_agent_dashboard'))
 
     finally:
         cursor.close()
         conn.close()
-        print("Database connection closed.")
+
+# Hold seats while the buyer checks out (customers for themselves, agents for a customer).
+# The seats leave the free-list at once, so nobody else can buy them, and come back when the
+# hold expires; confirming it below does not touch the free-list rows again.
+@app.route('/hold_seats', methods=['POST'])
+@login_required
+def hold_seats():
+    role = session['role']
+    if role not in ('customer', 'booking_agent'):
+        flash('You do not have permission to perform this action.', 'danger')
+        return redirect(url_for('home'))
+    dashboard = 'customer_dashboard' if role == 'customer' else 'agent_search_flights'
+
+    try:
+        quantity = seats.party_size(request.form.get('quantity'), MAX_PARTY_SIZE)
+    except ValueError:
+        flash(f'You can book between 1 and {MAX_PARTY_SIZE} seats at a time.', 'danger')
+        return redirect(url_for(dashboard))
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        flight_num = request.form['flight_num']
+        if role == 'customer':
+            airline_name = request.form['airline_name']
+            customer_email = session['user_email']
+            booking_agent_id = None
+        else:
+            principal = current_principal()
+            airline_name = principal['airline_name']
+            booking_agent_id = principal['booking_agent_id']
+            if booking_agent_id is None or not airline_name:
+                flash('No booking agent record or airline found. Please contact support.', 'danger')
+                return redirect(url_for(dashboard))
+            customer_email = request.form['customer_email']
+            cursor.execute("SELECT email FROM customer WHERE email = %s", (customer_email,))
+            if cursor.fetchone() is None:
+                flash('Customer email not found. Please check the email and try again.', 'danger')
+                return redirect(url_for(dashboard))
+
+        ttl = current_app.config['SEAT_HOLD_TTL']
+        hold_id = holds.create_hold(cursor, airline_name, flight_num, quantity, customer_email, booking_agent_id, ttl)
+        if hold_id is None:
+            conn.rollback()
+            flash('No tickets are available for this flight.' if quantity == 1
+                  else f'Fewer than {quantity} tickets are available for this flight.', 'danger')
+            return redirect(url_for(dashboard))
+        conn.commit()
+        fare_calendar.record_sale(airline_name, flight_num, tickets=quantity)
+        holds.held_seats.inc(('held',), quantity)
+        current_app.extensions['hold_sweeper'].schedule(ttl)
+        return redirect(url_for('checkout', hold_id=hold_id))
+
+    except Exception as e:
+        conn.rollback()
+        flash(f'An error occurred: {e}', 'danger')
+        return redirect(url_for(dashboard))
+    finally:
+        cursor.close()
+        conn.close()
+
+# A hold belongs to the customer it was made by, or to the agent who made it for a customer
+def _holds_for_viewer(hold):
+    if session['role'] == 'booking_agent':
+        return hold['booking_agent_id'] is not None and \
+            hold['booking_agent_id'] == current_principal()['booking_agent_id']
+    return hold['booking_agent_id'] is None and hold['customer_email'] == session['user_email']
+
+def _checkout_done_url():
+    return url_for('booking_agent_dashboard' if session['role'] == 'booking_agent' else 'customer_dashboard')
+
+@app.route('/checkout/<hold_id>')
+@login_required
+def checkout(hold_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        hold = holds.get_hold(cursor, hold_id)
+    finally:
+        cursor.close()
+        conn.close()
+    if hold is None or not _holds_for_viewer(hold):
+        flash('This hold has expired and its seats were released. Please search again.', 'danger')
+        return redirect(_checkout_done_url())
+    return render_template('checkout.html', hold=hold)
+
+# Turn the hold into purchases. Locking its seat_hold rows (not the free-list) keeps the
+# sweeper off them; a hold that expired first is gone, and the buyer has to start over.
+@app.route('/checkout/<hold_id>/confirm', methods=['POST'])
+@login_required
+def confirm_checkout(hold_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        hold = holds.get_hold(cursor, hold_id, lock=True)
+        if hold is None or not _holds_for_viewer(hold):
+            conn.rollback()
+            flash('This hold has expired and its seats were released. Please search again.', 'danger')
+            return redirect(_checkout_done_url())
+
+        airline_name, flight_num, quantity = hold['airline_name'], hold['flight_num'], len(hold['ticket_ids'])
+        via_agent = hold['booking_agent_id'] is not None
+        holds.confirm_hold(cursor, hold)
+        sales.record_sale(cursor, airline_name, flight_num, via_agent=via_agent, tickets=quantity)
+        if via_agent:
+            sales.record_agent_sale(cursor, airline_name, flight_num, hold['booking_agent_id'], tickets=quantity)
+        destinations.record_tickets(cursor, airline_name, flight_num, tickets=quantity)
+        fragments.bump(cursor, f"customer:{hold['customer_email']}", f'airline:{airline_name}')
+        conn.commit()
+        holds.held_seats.inc(('confirmed',), quantity)
+        flash('Ticket purchased successfully!' if quantity == 1 else f'{quantity} tickets purchased successfully!',
+              'success')
+        return redirect(_checkout_done_url())
+
+    except Exception as e:
+        conn.rollback()
+        flash(f'An error occurred: {e}', 'danger')
+        return redirect(_checkout_done_url())
+    finally:
+        cursor.close()
+        conn.close()
+
+# Give the seats back before the hold runs out
+@app.route('/checkout/<hold_id>/release', methods=['POST'])
+@login_required
+def release_checkout(hold_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        hold = holds.get_hold(cursor, hold_id, lock=True)
+        if hold is not None and _holds_for_viewer(hold):
+            holds.release_hold(cursor, hold_id)
+            conn.commit()
+            fare_calendar.record_release(hold['airline_name'], hold['flight_num'], tickets=len(hold['ticket_ids']))
+            holds.held_seats.inc(('released',), len(hold['ticket_ids']))
+        else:
+            conn.rollback()
+        flash('Your held seats were released.', 'success')
+        return redirect(_checkout_done_url())
+    except Exception as e:
+        conn.rollback()
+        flash(f'An error occurred: {e}', 'danger')
+        return redirect(_checkout_done_url())
+    finally:
+        cursor.close()
+        conn.close()
 
 ####################################################################################################
 
@@ -834,37 +1026,23 @@ def airline_staff_dashboard():
         return redirect(url_for('home'))
 
     # Check which staff permissions this user has
-    if check_admin_permissions(user_email) and check_operator_permission(user_email):
+    is_admin = check_admin_permissions(user_email)
+    is_operator = check_operator_permission(user_email)
+    if is_admin and is_operator:
         flash('You are logged in as an admin and operator.', 'success')
-    elif check_admin_permissions(user_email):
+    elif is_admin:
         flash('You are logged in as an admin.', 'success')
-    elif check_operator_permission(user_email):
+    elif is_operator:
         flash('You are logged in as an operator.', 'success')
     else:
         flash('You are logged in as a regular airline staff member.', 'success')
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
 
     try:
         # Fetch the airline name for the logged-in airline staff
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
-
-        # Default query to get upcoming flights (next 30 days)
-        query = """
-            SELECT f.flight_num, f.departure_time, f.arrival_time, f.departure_airport, f.arrival_airport,
-                   f.airline_name, COUNT(p.ticket_id) AS num_customers
-            FROM flight f
-            LEFT JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
-            LEFT JOIN purchases p ON t.ticket_id = p.ticket_id
-            WHERE f.airline_name = %s AND f.departure_time >= CURDATE()
-            GROUP BY f.flight_num
-            HAVING f.departure_time <= CURDATE() + INTERVAL 30 DAY
-            ORDER BY f.departure_time;
-        """
-        cursor.execute(query, (airline_name,))
-        flights = cursor.fetchall()
+        airline_name = current_principal()['airline_name']
 
         # Custom filtering based on date range, airports/cities
         if request.method == 'POST':
@@ -875,7 +1053,7 @@ def airline_staff_dashboard():
 
             query = """
                 SELECT f.flight_num, f.departure_time, f.arrival_time, f.departure_airport, f.arrival_airport,
-                       COUNT(p.ticket_id) AS num_customers
+                       f.airline_name, COUNT(p.ticket_id) AS num_customers
                 FROM flight f
                 LEFT JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
                 LEFT JOIN purchases p ON t.ticket_id = p.ticket_id
@@ -889,18 +1067,28 @@ def airline_staff_dashboard():
             cursor.execute(query, (airline_name, start_date, end_date, f'%{source_airport}%', f'%{destination_airport}%'))
             flights = cursor.fetchall()
 
-        # Query to get customers for each flight
+        else:
+            # Default query to get upcoming flights (next 30 days)
+            query = """
+                SELECT f.flight_num, f.departure_time, f.arrival_time, f.departure_airport, f.arrival_airport,
+                       f.airline_name, COUNT(p.ticket_id) AS num_customers
+                FROM flight f
+                LEFT JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
+                LEFT JOIN purchases p ON t.ticket_id = p.ticket_id
+                WHERE f.airline_name = %s AND f.departure_time >= CURDATE()
+                GROUP BY f.flight_num
+                HAVING f.departure_time <= CURDATE() + INTERVAL 30 DAY
+                ORDER BY f.departure_time;
+            """
+            cursor.execute(query, (airline_name,))
+            flights = cursor.fetchall()
+
+        # Customers for every listed flight in one batched query; for very large windows the
+        # page loads each manifest on demand from flight_manifest() instead
+        lazy_manifests = len(flights) > MANIFEST_INLINE_LIMIT
         flight_customers = {}
-        for flight in flights:
-            cursor.execute("""
-                SELECT c.name, c.email
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN customer c ON p.customer_email = c.email
-                WHERE t.flight_num = %s AND t.airline_name = %s;
-            """, (flight['flight_num'], airline_name))
-            customers = cursor.fetchall()
-            flight_customers[flight['flight_num']] = customers
+        if not lazy_manifests:
+            flight_customers = manifests.fetch_manifests(cursor, airline_name, [flight['flight_num'] for flight in flights])
 
     except Exception as e:
         flash(f'Error retrieving flight data: {e}', 'danger')
@@ -909,10 +1097,25 @@ def airline_staff_dashboard():
         cursor.close()
         conn.close()
 
-    return render_template('airline_staff_dashboard.html',
-                           flights=flights, flight_customers=flight_customers,
-                           check_admin_permissions=check_admin_permissions,
-                           check_operator_permission=check_operator_permission)
+    return render_template('airline_staff_dashboard.html', airline_name=airline_name, today=date.today(),
+                           flights=flights, flight_customers=flight_customers, lazy_manifests=lazy_manifests,
+                           is_admin=is_admin, is_operator=is_operator)
+
+# Staff: Passenger manifest of one of the airline's flights, as JSON
+@app.route('/flight_manifest/<int:flight_num>')
+@login_required
+def flight_manifest(flight_num):
+    if session['role'] != 'airline_staff':
+        return jsonify(error='You do not have permission to access this page.'), 403
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        customers = manifests.fetch_manifest(cursor, current_principal()['airline_name'], flight_num)
+    finally:
+        cursor.close()
+        conn.close()
+    return jsonify(flight_num=flight_num, customers=customers)
 
 # Staff (Admin) Grant New Permissions
 @app.route('/grant_permissions', methods=['GET', 'POST'])
@@ -954,6 +1157,8 @@ def grant_permissions():
             # Insert the new permission for the staff member
             cursor.execute("INSERT INTO permission (username, permission_type) VALUES (%s, %s)",
                            (staff_username, new_permission))
+            # Make the staff member's cached principal reload on their next permission check
+            bump_permission_version(cursor, staff_username)
             conn.commit()
 
             flash('Permission granted successfully!', 'success')
@@ -974,25 +1179,27 @@ def grant_permissions():
 
     return render_template('grant_permissions.html', staff_members=staff_members)
 
-# Helper function to check if the logged-in staff has "Admin" permission
-def check_admin_permissions(user_email):
+# Look up a staff member's permission directly (for users other than the logged-in one)
+def _query_permission(user_email, permission_type):
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM permission WHERE username = %s AND permission_type = 'Admin'", (user_email,))
+    cursor.execute("SELECT * FROM permission WHERE username = %s AND permission_type = %s", (user_email, permission_type))
     result = cursor.fetchone()
     cursor.close()
     conn.close()
     return result is not None
 
+# Helper function to check if the logged-in staff has "Admin" permission
+def check_admin_permissions(user_email):
+    if user_email == session.get('user_email'):
+        return has_permission('Admin')
+    return _query_permission(user_email, 'Admin')
+
 # Helper function to check if the logged-in staff has "Operator" permission
 def check_operator_permission(user_email):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM permission WHERE username = %s AND permission_type = 'Operator'", (user_email,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result is not None
+    if user_email == session.get('user_email'):
+        return has_permission('Operator')
+    return _query_permission(user_email, 'Operator')
 
 # Staff (Admin) Add Booking Agent
 @app.route('/add_booking_agent', methods=['GET', 'POST'])
@@ -1023,7 +1230,7 @@ def add_booking_agent():
 
             # Generate a hashed password for the booking agent
             default_password = '1234'
-            hashed_password = bcrypt.generate_password_hash(default_password).decode('utf-8')
+            hashed_password = hash_password(default_password)
 
             # Insert the new booking agent into the booking_agent table
             cursor.execute(
@@ -1097,14 +1304,16 @@ def create_flight():
                 flash('Flight number already exists for this airline.', 'danger')
                 return redirect(url_for('create_flight'))
 
-            # Insert the new flight into the flight table
+            # Insert the new flight and its tickets in one transaction, so a failure leaves nothing behind
             cursor.execute("""
                 INSERT INTO flight (airline_name, flight_num, departure_airport, departure_time,
                                     arrival_airport, arrival_time, price, status, airplane_id)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (airline_name, flight_num, departure_airport, departure_time,
                   arrival_airport, arrival_time, price, status, airplane_id))
-            conn.commit()
+            destinations.record_flight(cursor, airline_name, flight_num)
+            version = schedule.bump(cursor)
+            fragments.bump(cursor, f'airline:{airline_name}', 'schedule')
 
             # Create tickets based on the number of seats on the airplane
             cursor.execute("""
@@ -1113,13 +1322,16 @@ def create_flight():
             airplane = cursor.fetchone()
             
             if airplane:
-                number_of_seats = airplane['seats']
-                for i in range(number_of_seats):
-                    cursor.execute("""
-                        INSERT INTO ticket (airline_name, flight_num) 
-                        VALUES (%s, %s)
-                    """, (airline_name, flight_num))
-                conn.commit()
+                started = time.perf_counter()
+                number_of_tickets = seats.create_flight_inventory(cursor, airline_name, flight_num, airplane['seats'])
+                app.logger.info('Created %d tickets for %s %s in %.1f ms', number_of_tickets,
+                                airline_name, flight_num, (time.perf_counter() - started) * 1000)
+
+            conn.commit()
+            airport_catalog.invalidate()
+            schedule_version.invalidate()
+            route_graph.update_flight(cursor, airline_name, flight_num, version)
+            fare_calendar.invalidate_route(departure_airport, arrival_airport)
 
             flash('Flight created successfully and tickets added!', 'success')
             return redirect(url_for('airline_staff_dashboard'))  # Redirect to the dashboard
@@ -1166,7 +1378,19 @@ def change_flight_status(airline_name, flight_num):
                 SET status = %s
                 WHERE airline_name = %s AND flight_num = %s
             """, (new_status, airline_name, flight_num))
+            # Route whose cached fares to drop; a cancelled flight is left out of them, so it cannot be looked up there
+            cursor.execute("""
+                SELECT departure_airport, arrival_airport FROM flight
+                WHERE airline_name = %s AND flight_num = %s
+            """, (airline_name, flight_num))
+            route = cursor.fetchone()
+            version = schedule.bump(cursor)
+            fragments.bump(cursor, f'airline:{airline_name}', 'schedule')
             conn.commit()
+            schedule_version.invalidate()
+            route_graph.update_flight(cursor, airline_name, flight_num, version)
+            if route is not None:
+                fare_calendar.invalidate_route(route['departure_airport'], route['arrival_airport'])
             flash('Flight status updated successfully!', 'success')
             return redirect(url_for('airline_staff_dashboard'))  # Redirect to the dashboard
         except Exception as e:
@@ -1309,6 +1533,7 @@ def add_airport():
                 VALUES (%s, %s)
             """, (airport_name, airport_city))
             conn.commit()
+            airport_catalog.invalidate()
 
             flash('Airport added successfully!', 'success')
             return redirect(url_for('add_airport'))
@@ -1354,7 +1579,6 @@ def airport_list():
 @app.route('/view_booking_agents')
 @login_required
 def view_booking_agents():
-    user_email = session['user_email']
     role = session['role']
 
     # Ensure only airline staff can access this route
@@ -1362,51 +1586,18 @@ def view_booking_agents():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
 
     try:
         # Fetch airline name for the logged-in staff member
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
+        airline_name = current_principal()['airline_name']
 
-        # Get top 5 booking agents based on the number of tickets sold in the past month
-        cursor.execute("""
-            SELECT ba.email, COUNT(p.ticket_id) AS tickets_sold
-            FROM booking_agent ba
-            LEFT JOIN purchases p ON ba.booking_agent_id = p.booking_agent_id
-            WHERE p.purchase_date >= CURDATE() - INTERVAL 1 MONTH OR p.purchase_date IS NULL
-            GROUP BY ba.email
-            ORDER BY tickets_sold DESC
-            LIMIT 5
-        """)
-        top_agents_by_sales_month = cursor.fetchall()
-
-        # Get top 5 booking agents based on the number of tickets sold in the past year
-        cursor.execute("""
-            SELECT ba.email, COUNT(p.ticket_id) AS tickets_sold
-            FROM booking_agent ba
-            LEFT JOIN purchases p ON ba.booking_agent_id = p.booking_agent_id
-            WHERE p.purchase_date >= CURDATE() - INTERVAL 1 YEAR OR p.purchase_date IS NULL
-            GROUP BY ba.email
-            ORDER BY tickets_sold DESC
-            LIMIT 5
-        """)
-        top_agents_by_sales_year = cursor.fetchall()
-
-        # Get top 5 booking agents based on the commission earned in the past year
-        cursor.execute("""
-            SELECT ba.email, COALESCE(SUM(f.price * 0.05), 0) AS commission_received
-            FROM booking_agent ba
-            LEFT JOIN purchases p ON ba.booking_agent_id = p.booking_agent_id
-            LEFT JOIN ticket t ON p.ticket_id = t.ticket_id
-            LEFT JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = f.airline_name
-            WHERE p.purchase_date >= CURDATE() - INTERVAL 1 YEAR OR p.purchase_date IS NULL
-            GROUP BY ba.email
-            ORDER BY commission_received DESC
-            LIMIT 5
-        """)
-        top_agents_by_commission = cursor.fetchall()
+        # Top 5 of the airline's booking agents by tickets sold in the past month and year, and by
+        # commission earned in the past year, from the daily agent performance summary
+        today = date.today()
+        top_agents_by_sales_month, top_agents_by_sales_year, top_agents_by_commission = sales.agent_leaderboards(
+            cursor, airline_name, sales.months_before(today, 1), sales.months_before(today, 12))
 
     except Exception as e:
         flash(f'Error retrieving booking agents: {e}', 'danger')
@@ -1424,7 +1615,6 @@ def view_booking_agents():
 @app.route('/view_frequent_customers', methods=['GET', 'POST'])
 @login_required
 def view_frequent_customers():
-    user_email = session['user_email']
     role = session['role']
     
     # Ensure that only Airline Staff can access this route
@@ -1432,13 +1622,12 @@ def view_frequent_customers():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
     
     try:
         # Get the airline name for the logged-in airline staff
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
+        airline_name = current_principal()['airline_name']
         
         # Get the top frequent customers based on ticket purchases in the last year
         cursor.execute("""
@@ -1491,7 +1680,6 @@ def view_frequent_customers():
 @app.route('/view_reports', methods=['GET', 'POST'])
 @login_required
 def view_reports():
-    user_email = session['user_email']
     role = session['role']
     
     # Ensure only airline staff can access this page
@@ -1499,7 +1687,7 @@ def view_reports():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
 
     # Initialize variables for the reports
@@ -1510,58 +1698,24 @@ def view_reports():
 
     try:
         # Get the airline name for the logged-in staff
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
+        airline_name = current_principal()['airline_name']
         
         if request.method == 'POST':
             # Handle custom date range
             start_date = request.form['start_date']
             end_date = request.form['end_date']
-
-            # Get total tickets sold within the custom date range
-            cursor.execute("""
-                SELECT COUNT(p.ticket_id) AS total_sales
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-                WHERE p.purchase_date BETWEEN %s AND %s
-            """, (airline_name, start_date, end_date))
-            total_sales = cursor.fetchone()['total_sales'] or 0
-
-            # Get month-wise sales for the custom date range
-            cursor.execute("""
-                SELECT DATE_FORMAT(p.purchase_date, '%Y-%m') AS month, COUNT(p.ticket_id) AS tickets_sold
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-                WHERE p.purchase_date BETWEEN %s AND %s
-                GROUP BY month
-                ORDER BY month
-            """, (airline_name, start_date, end_date))
-            month_wise_sales = cursor.fetchall()
-
+            window_start = date.fromisoformat(start_date)
+            window_end = date.fromisoformat(end_date)
         else:
-            # Get total tickets sold in the last year
-            cursor.execute("""
-                SELECT COUNT(p.ticket_id) AS total_sales
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-                WHERE p.purchase_date >= CURDATE() - INTERVAL 1 YEAR
-            """, (airline_name,))
-            total_sales = cursor.fetchone()['total_sales'] or 0
+            # Default to the last year
+            window_end = date.today()
+            window_start = sales.months_before(window_end, 12)
 
-            # Get month-wise sales for the last year
-            cursor.execute("""
-                SELECT DATE_FORMAT(p.purchase_date, '%Y-%m') AS month, COUNT(p.ticket_id) AS tickets_sold
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-                WHERE p.purchase_date >= CURDATE() - INTERVAL 1 YEAR
-                GROUP BY month
-                ORDER BY month
-            """, (airline_name,))
-            month_wise_sales = cursor.fetchall()
+        # Tickets sold per month, summed from the daily sales rollup
+        monthly = sales.sales_between(cursor, airline_name, window_start, window_end)
+        month_wise_sales = [{'month': month, 'tickets_sold': totals['direct']['tickets'] + totals['agent']['tickets']}
+                            for month, totals in monthly.items()]
+        total_sales = sum(entry['tickets_sold'] for entry in month_wise_sales)
 
     except Exception as e:
         flash(f'Error retrieving report data: {e}', 'danger')
@@ -1578,7 +1732,6 @@ def view_reports():
 @app.route('/view_revenue_comparison', methods=['GET'])
 @login_required
 def view_revenue_comparison():
-    user_email = session['user_email']
     role = session['role']
 
     # Ensure only airline staff can access this page
@@ -1586,7 +1739,7 @@ def view_revenue_comparison():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
 
     # Initialize variables
@@ -1597,48 +1750,17 @@ def view_revenue_comparison():
 
     try:
         # Get the airline name for the logged-in staff
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
+        airline_name = current_principal()['airline_name']
 
-        # Revenue for last month (direct sales)
-        cursor.execute("""
-            SELECT SUM(f.price) AS direct_revenue
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-            WHERE p.booking_agent_id IS NULL AND p.purchase_date >= CURDATE() - INTERVAL 1 MONTH
-        """, (airline_name,))
-        direct_revenue_last_month = cursor.fetchone()['direct_revenue'] or 0
+        # Direct and indirect (booking agent) revenue for the last month and last year, from the sales rollup
+        today = date.today()
+        last_month = sales.sales_between(cursor, airline_name, sales.months_before(today, 1), today).values()
+        last_year = sales.sales_between(cursor, airline_name, sales.months_before(today, 12), today).values()
 
-        # Revenue for last month (indirect sales)
-        cursor.execute("""
-            SELECT SUM(f.price) AS indirect_revenue
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-            WHERE p.booking_agent_id IS NOT NULL AND p.purchase_date >= CURDATE() - INTERVAL 1 MONTH
-        """, (airline_name,))
-        indirect_revenue_last_month = cursor.fetchone()['indirect_revenue'] or 0
-
-        # Revenue for last year (direct sales)
-        cursor.execute("""
-            SELECT SUM(f.price) AS direct_revenue
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-            WHERE p.booking_agent_id IS NULL AND p.purchase_date >= CURDATE() - INTERVAL 1 YEAR
-        """, (airline_name,))
-        direct_revenue_last_year = cursor.fetchone()['direct_revenue'] or 0
-
-        # Revenue for last year (indirect sales)
-        cursor.execute("""
-            SELECT SUM(f.price) AS indirect_revenue
-            FROM purchases p
-            JOIN ticket t ON p.ticket_id = t.ticket_id
-            JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = %s
-            WHERE p.booking_agent_id IS NOT NULL AND p.purchase_date >= CURDATE() - INTERVAL 1 YEAR
-        """, (airline_name,))
-        indirect_revenue_last_year = cursor.fetchone()['indirect_revenue'] or 0
+        direct_revenue_last_month = sum(totals['direct']['revenue'] for totals in last_month)
+        indirect_revenue_last_month = sum(totals['agent']['revenue'] for totals in last_month)
+        direct_revenue_last_year = sum(totals['direct']['revenue'] for totals in last_year)
+        indirect_revenue_last_year = sum(totals['agent']['revenue'] for totals in last_year)
 
     except Exception as e:
         flash(f'Error retrieving revenue data: {e}', 'danger')
@@ -1657,7 +1779,6 @@ def view_revenue_comparison():
 @app.route('/view_top_destinations', methods=['GET'])
 @login_required
 def view_top_destinations():
-    user_email = session['user_email']
     role = session['role']
 
     # Ensure that only airline staff can access this page
@@ -1665,40 +1786,27 @@ def view_top_destinations():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('home'))
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(dictionary=True)
 
     top_destinations_last_3_months = []
     top_destinations_last_year = []
+    top_destinations_by_tickets_last_3_months = []
+    top_destinations_by_tickets_last_year = []
 
     try:
         # Get the airline name for the logged-in staff
-        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (user_email,))
-        airline_name = cursor.fetchone()['airline_name']
-
-        # Top 3 destinations for the last 3 months
-        cursor.execute("""
-            SELECT f.arrival_airport, a.airport_city, COUNT(f.flight_num) AS num_flights
-            FROM flight f
-            JOIN airport a ON f.arrival_airport = a.airport_name
-            WHERE f.airline_name = %s AND f.departure_time >= CURDATE() - INTERVAL 3 MONTH
-            GROUP BY f.arrival_airport
-            ORDER BY num_flights DESC
-            LIMIT 3
-        """, (airline_name,))
-        top_destinations_last_3_months = cursor.fetchall()
-
-        # Top 3 destinations for the last year
-        cursor.execute("""
-            SELECT f.arrival_airport, a.airport_city, COUNT(f.flight_num) AS num_flights
-            FROM flight f
-            JOIN airport a ON f.arrival_airport = a.airport_name
-            WHERE f.airline_name = %s AND f.departure_time >= CURDATE() - INTERVAL 1 YEAR
-            GROUP BY f.arrival_airport
-            ORDER BY num_flights DESC
-            LIMIT 3
-        """, (airline_name,))
-        top_destinations_last_year = cursor.fetchall()
+        airline_name = current_principal()['airline_name']
+
+        # Top 3 destinations for the last 3 months and the last year, by flights and by tickets sold,
+        # from the monthly destination counters (windows start on the first of the month)
+        today = date.today()
+        since_3_months = sales.months_before(today, 3).replace(day=1)
+        since_year = sales.months_before(today, 12).replace(day=1)
+        top_destinations_last_3_months = destinations.top_destinations(cursor, airline_name, since_3_months)
+        top_destinations_last_year = destinations.top_destinations(cursor, airline_name, since_year)
+        top_destinations_by_tickets_last_3_months = destinations.top_destinations(cursor, airline_name, since_3_months, by='tickets')
+        top_destinations_by_tickets_last_year = destinations.top_destinations(cursor, airline_name, since_year, by='tickets')
 
     except Exception as e:
         flash(f'Error retrieving top destinations data: {e}', 'danger')
@@ -1709,9 +1817,80 @@ def view_top_destinations():
 
     return render_template('view_top_destinations.html',
                            top_destinations_last_3_months=top_destinations_last_3_months,
-                           top_destinations_last_year=top_destinations_last_year)
+                           top_destinations_last_year=top_destinations_last_year,
+                           top_destinations_by_tickets_last_3_months=top_destinations_by_tickets_last_3_months,
+                           top_destinations_by_tickets_last_year=top_destinations_by_tickets_last_year)
+
+# All Staff: Export the airline's purchases, passenger manifests or flight schedule
+# e.g. /export/purchases?start=2024-01-01&end=2024-12-31&format=ndjson (format defaults to csv)
+@app.route('/export/<dataset>')
+@login_required
+def export_data(dataset):
+    if session['role'] != 'airline_staff':
+        return 'You do not have permission to access this page.', 403
+
+    export_format = request.args.get('format', 'csv')
+    if dataset not in exports.EXPORT_QUERIES or export_format not in exports.EXPORT_FORMATS:
+        return 'Unknown export. Use purchases, manifests or flights as csv or ndjson.', 404
+
+    try:
+        start, end = exports.date_range(request.args.get('start', ''), request.args.get('end', ''))
+    except ValueError:
+        return 'start and end dates (YYYY-MM-DD) are required.', 400
+
+    airline_name = current_principal()['airline_name']
+    conn = get_read_connection()
+    filename = f"{dataset}_{request.args['start']}_{request.args['end']}.{export_format}"
+
+    # stream_with_context keeps the request (and its pooled connection) alive until the last row is sent
+    return Response(stream_with_context(exports.stream_export(conn, dataset, airline_name, start, end, export_format)),
+                    mimetype=exports.EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# Backfill: flask --app "app:create_app()" rebuild-sales-rollup
+@app.cli.command('rebuild-sales-rollup')
+def rebuild_sales_rollup():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        rows = sales.rebuild(cursor)
+        agent_rows = sales.rebuild_agent_performance(cursor)
+        destination_rows = destinations.rebuild(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'Rebuilt sales rollup: {rows} rows, agent performance: {agent_rows} rows, '
+          f'destination counts: {destination_rows} rows.')
+
+# Release expired seat holds now, e.g. after downtime: flask --app "app:create_app()" sweep-seat-holds
+@app.cli.command('sweep-seat-holds')
+def sweep_seat_holds():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    released = 0
+    try:
+        while True:
+            rows = holds.sweep_expired(cursor, app.config['SEAT_HOLD_SWEEP_BATCH'])
+            conn.commit()
+            released += len(rows)
+            if len(rows) < app.config['SEAT_HOLD_SWEEP_BATCH']:
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'Released {released} expired held seats.')
 
 ####################################################################################################
 
+# Development server on WEB_BIND ("host:port", like gunicorn's bind); use gunicorn (see README) in production
 if __name__ == '__main__':
-    app.run(debug=True, port=5002)
\ No newline at end of file
+    create_app()
+    host, _, port = app.config['WEB_BIND'].rpartition(':')
+    app.run(host=host.strip('[]') or None, port=int(port), debug=app.config['DEBUG'])
\ No newline at end of file
@@ -0,0 +1,205 @@
+# Synthetic data generator for load testing.
+#
+# Scales airlines, airports, airplanes, flights, tickets, customers, booking agents and purchases
+# to the requested sizes and bulk-loads them into a local MySQL database that already has the
+# schema from resources/ (create_tables, indexes, seat_inventory and the rollup tables).
+# The same --seed always produces the same data.
+#
+#   python benchmarks/generate_data.py --reset --flights 50000 --seats 200   # 10M tickets
+#
+# Every generated account uses the password given by --password (default "password"):
+# customer<N>@example.com, agent<N>@example.com and staff<N>@example.com (Admin and Operator).
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import product
+from string import ascii_uppercase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'resources'))
+
+import mysql.connector
+from flask_bcrypt import generate_password_hash
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_NAME
+from ticketgenerating import ticket_rows
+import sales
+import destinations
+
+# Child tables first, so --reset can empty them in order
+TABLES = ['sales_rollup', 'agent_performance', 'destination_counts', 'seat_hold', 'available_ticket', 'purchases',
+          'ticket', 'flight', 'schedule_version', 'data_version', 'permission_version', 'permission',
+          'booking_agent_work_for', 'booking_agent', 'customer', 'airline_staff', 'airplane', 'airport', 'airline']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate and bulk-load synthetic airline data.')
+    parser.add_argument('--host', default=MYSQL_HOST)
+    parser.add_argument('--user', default=MYSQL_USER)
+    parser.add_argument('--db-password', default=MYSQL_PASSWORD)
+    parser.add_argument('--database', default=MYSQL_NAME)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='empty all tables before loading')
+    parser.add_argument('--airlines', type=int, default=5)
+    parser.add_argument('--airports', type=int, default=50)
+    parser.add_argument('--airplanes', type=int, default=20, help='airplanes per airline')
+    parser.add_argument('--flights', type=int, default=5000)
+    parser.add_argument('--seats', type=int, default=200, help='seats per airplane')
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--agents', type=int, default=50)
+    parser.add_argument('--fill-rate', type=float, default=0.6, help='average share of seats sold')
+    parser.add_argument('--agent-share', type=float, default=0.3, help='share of purchases made by agents')
+    parser.add_argument('--password', default='password', help='password of every generated account')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    return parser.parse_args()
+
+
+class Loader:
+    def __init__(self, conn, batch_size):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+
+    # Multi-row INSERTs of batch_size rows, committing after each batch to keep transactions small
+    def insert(self, table, columns, rows):
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        started = time.perf_counter()
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.cursor.executemany(sql, batch)
+                self.conn.commit()
+                count += len(batch)
+                batch.clear()
+        if batch:
+            self.cursor.executemany(sql, batch)
+            self.conn.commit()
+            count += len(batch)
+        print(f'{table}: {count} rows in {time.perf_counter() - started:.1f}s')
+        return count
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(microsecond=0)
+    today = now.date()
+    password_hash = generate_password_hash(args.password).decode('utf-8')
+
+    conn = mysql.connector.connect(host=args.host, user=args.user, password=args.db_password, database=args.database)
+    loader = Loader(conn, args.batch_size)
+    loader.cursor.execute("SET foreign_key_checks = 0")
+    loader.cursor.execute("SET unique_checks = 0")
+
+    if args.reset:
+        for table in TABLES:
+            loader.cursor.execute(f"TRUNCATE TABLE {table}")
+        conn.commit()
+
+    airlines = [f'Airline {i}' for i in range(1, args.airlines + 1)]
+    airports = [''.join(code) for code, _ in zip(product(ascii_uppercase, repeat=3), range(args.airports))]
+
+    loader.insert('airline', ['airline_name'], [(name,) for name in airlines])
+    loader.insert('airport', ['airport_name', 'airport_city'], [(code, f'City {code}') for code in airports])
+    loader.insert('airplane', ['airline_name', 'airplane_id', 'seats'],
+                  [(airline, i, args.seats) for airline in airlines for i in range(1, args.airplanes + 1)])
+
+    staff = [(f'staff{i}@example.com', airline) for i, airline in enumerate(airlines, 1)]
+    loader.insert('airline_staff', ['username', 'password', 'first_name', 'last_name', 'date_of_birth', 'airline_name'],
+                  [(username, password_hash, 'Staff', str(i), '1980-01-01', airline)
+                   for i, (username, airline) in enumerate(staff, 1)])
+    loader.insert('permission', ['username', 'permission_type'],
+                  [(username, permission) for username, _ in staff for permission in ('Admin', 'Operator')])
+
+    agents_by_airline = {airline: [] for airline in airlines}
+    agent_rows, work_for_rows = [], []
+    for i in range(1, args.agents + 1):
+        email, airline = f'agent{i}@example.com', rng.choice(airlines)
+        agent_rows.append((email, password_hash, i))
+        work_for_rows.append((email, airline))
+        agents_by_airline[airline].append(i)
+    loader.insert('booking_agent', ['email', 'password', 'booking_agent_id'], agent_rows)
+    loader.insert('booking_agent_work_for', ['email', 'airline_name'], work_for_rows)
+
+    loader.insert('customer', ['email', 'name', 'password', 'building_number', 'street', 'city', 'state',
+                               'phone_number', 'passport_number', 'passport_expiration', 'passport_country',
+                               'date_of_birth'],
+                  ((f'customer{i}@example.com', f'Customer {i}', password_hash, str(i % 500 + 1), 'Main St',
+                    'New York', 'NY', 5550000 + i, f'P{i:09d}', '2035-01-01', 'USA', '1990-01-01')
+                   for i in range(1, args.customers + 1)))
+
+    # Flights spread from a year ago to six months ahead, each with its own block of ticket ids
+    flights = []
+    next_flight_num = {airline: 1 for airline in airlines}
+    next_ticket_id = 1
+    for _ in range(args.flights):
+        airline = rng.choice(airlines)
+        flight_num = next_flight_num[airline]
+        next_flight_num[airline] += 1
+        departure_airport, arrival_airport = rng.sample(airports, 2)
+        departure_time = now + timedelta(minutes=rng.randrange(-365 * 24 * 60, 180 * 24 * 60, 5))
+        arrival_time = departure_time + timedelta(minutes=rng.randrange(60, 14 * 60, 5))
+        if departure_time > now:
+            status = 'delayed' if rng.random() < 0.05 else 'upcoming'
+        else:
+            status = 'cancelled' if rng.random() < 0.02 else 'completed'
+        sold = min(args.seats, max(0, round(rng.gauss(args.fill_rate, 0.2) * args.seats)))
+        flights.append((airline, flight_num, departure_airport, departure_time, arrival_airport, arrival_time,
+                        rng.randrange(100, 1500, 5), status, rng.randint(1, args.airplanes), next_ticket_id, sold))
+        next_ticket_id += args.seats
+
+    loader.insert('flight', ['airline_name', 'flight_num', 'departure_airport', 'departure_time', 'arrival_airport',
+                             'arrival_time', 'price', 'status', 'airplane_id'],
+                  (flight[:9] for flight in flights))
+
+    loader.insert('ticket', ['ticket_id', 'airline_name', 'flight_num'],
+                  (row for flight in flights for row in ticket_rows(flight[0], flight[1], args.seats, flight[9])))
+
+    # The first `sold` tickets of each flight are purchased, the rest stay on the free-list
+    def purchases():
+        for airline, flight_num, _, departure_time, *_, first_ticket_id, sold in flights:
+            latest = min(departure_time.date(), today)
+            for ticket_id in range(first_ticket_id, first_ticket_id + sold):
+                agents = agents_by_airline[airline]
+                booking_agent_id = rng.choice(agents) if agents and rng.random() < args.agent_share else None
+                yield (ticket_id, f'customer{rng.randint(1, args.customers)}@example.com', booking_agent_id,
+                       latest - timedelta(days=rng.randint(0, 90)))
+
+    loader.insert('purchases', ['ticket_id', 'customer_email', 'booking_agent_id', 'purchase_date'], purchases())
+
+    loader.insert('available_ticket', ['ticket_id', 'airline_name', 'flight_num'],
+                  (row for flight in flights
+                   for row in ticket_rows(flight[0], flight[1], args.seats - flight[10], flight[9] + flight[10])))
+
+    # Derived tables, rebuilt the same way the rebuild-sales-rollup command does
+    cursor = conn.cursor(dictionary=True)
+    started = time.perf_counter()
+    sales.rebuild(cursor)
+    sales.rebuild_agent_performance(cursor)
+    destinations.rebuild(cursor)
+    conn.commit()
+    print(f'rollups rebuilt in {time.perf_counter() - started:.1f}s')
+
+    # Mark the schedule as changed (recreating its row after --reset), so running apps drop their
+    # cached flight pages, route graph and flight snapshot
+    cursor.execute("""
+        INSERT INTO schedule_version (id, version, updated_at) VALUES (1, 1, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE version = version + 1, updated_at = UTC_TIMESTAMP()
+    """)
+    conn.commit()
+
+    cursor.close()
+    loader.cursor.close()
+    conn.close()
+    print(f'Done. Log in as customer1@example.com, agent1@example.com or staff1@example.com '
+          f'with password "{args.password}".')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+# Load-test driver for the booking app.
+#
+# Replays a weighted mix of guest, customer, booking agent and staff requests, either in-process
+# through the Flask test client (default) or against a running server (--url), and reports
+# p50/p95/p99 latency, throughput and, in-process, database queries per request for each route.
+# Purchases are real writes, so run it against a database loaded by generate_data.py.
+#
+#   python benchmarks/load_test.py --requests 5000 --concurrency 16
+#   python benchmarks/load_test.py --url http://localhost:5002 --mix search=50,home=50
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mysql.connector
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_NAME
+
+DEFAULT_MIX = {
+    'home': 10, 'api_flights': 5, 'search': 20, 'search_json': 5, 'flight_details': 10,
+    'customer_dashboard': 10, 'purchase': 5,
+    'agent_dashboard': 5, 'agent_search': 5, 'agent_purchase': 3,
+    'staff_dashboard': 7, 'reports': 5, 'revenue': 5, 'booking_agents': 5, 'top_destinations': 5,
+}
+# Writes that redirect whether they succeed or not and report the outcome as a flashed message
+WRITE_SCENARIOS = {'purchase', 'agent_purchase'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Replay a request mix against the booking app.')
+    parser.add_argument('--url', help='base URL of a running server; omit to use the Flask test client')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', help='comma-separated route=weight pairs, e.g. search=50,home=50')
+    parser.add_argument('--password', default='password', help='password of the generated accounts')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the results to this file')
+    return parser.parse_args()
+
+
+# Client for a running server; keeps its own session cookie and does not follow redirects,
+# matching the test client so both modes time the same single request
+class HttpClient:
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  self._NoRedirect())
+
+    # Status code of the response; its body is kept in self.text and any redirect target in self.location
+    def request(self, method, path, params=None):
+        url = self.base_url + path
+        data = None
+        if params and method == 'GET':
+            url += '?' + urllib.parse.urlencode(params)
+        elif params:
+            data = urllib.parse.urlencode(params).encode()
+        try:
+            with self.opener.open(urllib.request.Request(url, data=data, method=method)) as response:
+                self.text = response.read().decode(errors='replace')
+                self.location = None
+                return response.status
+        except urllib.error.HTTPError as e:
+            self.text = e.read().decode(errors='replace')
+            self.location = e.headers.get('Location')
+            return e.code
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, params=None):
+        if method == 'GET':
+            response = self.client.get(path, query_string=params)
+        else:
+            response = self.client.post(path, data=params)
+        self.text = response.get_data(as_text=True)
+        self.location = response.headers.get('Location')
+        response.close()
+        return response.status_code
+
+
+# Accounts and flights to build realistic requests from
+def load_fixtures():
+    conn = mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD, database=MYSQL_NAME)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT airline_name, flight_num, departure_airport, arrival_airport, DATE(departure_time) AS day
+        FROM flight WHERE departure_time >= NOW() ORDER BY departure_time LIMIT 2000
+    """)
+    flights = cursor.fetchall()
+    cursor.execute("SELECT email FROM customer LIMIT 500")
+    customers = [row['email'] for row in cursor.fetchall()]
+    cursor.execute("SELECT email, airline_name FROM booking_agent_work_for LIMIT 100")
+    agents = cursor.fetchall()
+    cursor.execute("SELECT username FROM airline_staff LIMIT 50")
+    staff = [row['username'] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    if not (flights and customers and agents and staff):
+        sys.exit('The database needs upcoming flights, customers, agents and staff; run generate_data.py first.')
+    return flights, customers, agents, staff
+
+
+# Categories of the messages flashed since the client's last page, read from a page that renders
+# them (the login form, which needs no database)
+def flash_categories(client):
+    client.request('GET', '/login')
+    return re.findall(r'class="flash-message flash-(\w+)"', client.text)
+
+
+# A client logged in as `email`. A successful login redirects to the role's dashboard and a
+# failed one renders the form again; the run stops on a failed login rather than timing every
+# later request of that role as a redirect to the login page.
+def logged_in_client(make_client, role, email, password):
+    client = make_client()
+    status = client.request('POST', '/login', {'role': role, 'email': email, 'password': password})
+    if status not in (301, 302, 303) or '/login' in (client.location or '/login'):
+        sys.exit(f'Could not log in as {role} {email} (HTTP {status}); check --password and the generated accounts.')
+    return client
+
+
+# One simulated user of each role, logged in on its own client
+class VirtualUser:
+    def __init__(self, make_client, fixtures, password, rng):
+        self.flights, customers, agents, staff = fixtures
+        self.rng = rng
+        self.guest = make_client()
+        self.customer = logged_in_client(make_client, 'customer', rng.choice(customers), password)
+        agent = rng.choice(agents)
+        self.agent = logged_in_client(make_client, 'booking_agent', agent['email'], password)
+        self.agent_flights = [flight for flight in self.flights if flight['airline_name'] == agent['airline_name']] or self.flights
+        self.customers = customers
+        self.staff = logged_in_client(make_client, 'airline_staff', rng.choice(staff), password)
+
+    def search_params(self, flight):
+        return {'source': flight['departure_airport'], 'destination': flight['arrival_airport'], 'date': str(flight['day'])}
+
+    def run(self, scenario):
+        flight = self.rng.choice(self.flights)
+        if scenario == 'home':
+            return self.guest.request('GET', '/')
+        if scenario == 'api_flights':
+            return self.guest.request('GET', '/api/flights')
+        if scenario == 'search':
+            return self.guest.request('GET', '/search', self.search_params(flight))
+        if scenario == 'search_json':
+            return self.guest.request('GET', '/search', {**self.search_params(flight), 'format': 'json'})
+        if scenario == 'flight_details':
+            return self.guest.request('GET', f"/flights/{flight['flight_num']}")
+        if scenario == 'customer_dashboard':
+            return self.customer.request('GET', '/customer_dashboard')
+        if scenario == 'purchase':
+            return self.customer.request('POST', '/purchase_ticket',
+                                         {'airline_name': flight['airline_name'], 'flight_num': flight['flight_num']})
+        if scenario == 'agent_dashboard':
+            return self.agent.request('GET', '/booking_agent_dashboard')
+        if scenario == 'agent_search':
+            return self.agent.request('POST', '/agent_search_flights', self.search_params(self.rng.choice(self.agent_flights)))
+        if scenario == 'agent_purchase':
+            return self.agent.request('POST', '/agent_purchase_ticket',
+                                      {'flight_num': self.rng.choice(self.agent_flights)['flight_num'],
+                                       'customer_email': self.rng.choice(self.customers)})
+        if scenario == 'staff_dashboard':
+            return self.staff.request('GET', '/airline_staff_dashboard')
+        if scenario == 'reports':
+            return self.staff.request('GET', '/view_reports')
+        if scenario == 'revenue':
+            return self.staff.request('GET', '/view_revenue_comparison')
+        if scenario == 'booking_agents':
+            return self.staff.request('GET', '/view_booking_agents')
+        if scenario == 'top_destinations':
+            return self.staff.request('GET', '/view_top_destinations')
+        raise ValueError(f'Unknown scenario {scenario}')
+
+    # Whether the write `scenario` just made was refused (sold out, bad input, database error).
+    # Called outside the timed request; it also clears the message so it does not pile up.
+    def write_failed(self, scenario):
+        client = self.customer if scenario == 'purchase' else self.agent
+        return 'danger' in flash_categories(client)
+
+
+# Per-thread query count of the last request, read from the app's own instrumentation (in-process only)
+_query_counter = threading.local()
+
+
+def install_query_counter(app):
+    from flask import request_finished
+    import metrics
+
+    def record(sender, response, **extra):
+        _query_counter.count = metrics.request_stats()['queries']
+
+    request_finished.connect(record, app, weak=False)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def main():
+    args = parse_args()
+    mix = DEFAULT_MIX
+    if args.mix:
+        mix = {name: int(weight) for name, weight in (pair.split('=') for pair in args.mix.split(','))}
+    scenarios, weights = list(mix), list(mix.values())
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        count_queries = False
+    else:
+        from app import create_app
+        app = create_app()
+        install_query_counter(app)
+        make_client = lambda: TestClient(app)
+        count_queries = True
+
+    fixtures = load_fixtures()
+    results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'queries': 0})
+    results_lock = threading.Lock()
+    remaining = [args.requests]
+
+    # Log every virtual user in up front, so a bad account or password stops the run before it starts
+    users = [VirtualUser(make_client, fixtures, args.password, random.Random(args.seed + i))
+             for i in range(args.concurrency)]
+
+    def worker(user):
+        rng = user.rng
+        while True:
+            with results_lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            _query_counter.count = 0
+            started = time.perf_counter()
+            try:
+                status = user.run(scenario)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            queries = getattr(_query_counter, 'count', 0)
+            failed = status >= 400
+            if not failed and scenario in WRITE_SCENARIOS:
+                try:
+                    failed = user.write_failed(scenario)
+                except Exception:
+                    failed = True
+            with results_lock:
+                result = results[scenario]
+                result['latencies'].append(elapsed)
+                result['queries'] += queries
+                if failed:
+                    result['errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    report = {}
+    print(f"{'route':<20}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'queries':>9}")
+    for scenario in sorted(results):
+        result = results[scenario]
+        latencies = sorted(result['latencies'])
+        count = len(latencies)
+        row = {
+            'count': count,
+            'errors': result['errors'],
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'throughput': round(count / wall_time, 2),
+            'queries_per_request': round(result['queries'] / count, 2) if count_queries else None,
+        }
+        report[scenario] = row
+        queries = f"{row['queries_per_request']:>9}" if count_queries else f"{'-':>9}"
+        print(f"{scenario:<20}{count:>7}{row['errors']:>8}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+              f"{row['throughput']:>8}{queries}")
+    total = sum(row['count'] for row in report.values())
+    print(f'\n{total} requests in {wall_time:.1f}s ({total / wall_time:.1f} req/s, concurrency {args.concurrency})')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'wall_time': wall_time, 'concurrency': args.concurrency, 'routes': report}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
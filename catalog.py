@@ -0,0 +1,56 @@
+import threading
+import time
+from db import get_db_connection
+
+
+# Process-wide cache of the airports that appear in the flight table, used to fill the
+# search form datalists. Entries expire after `ttl` seconds; invalidate() drops them
+# immediately when flights or airports are added.
+class AirportCatalog:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def _fresh(self):
+        return self._data is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    # Returns (departure_airports, arrival_airports) in the row shape the templates expect
+    def get(self):
+        if self._fresh():
+            return self._data
+
+        with self._lock:
+            if self._fresh():
+                return self._data
+            generation = self._generation
+
+        data = self._load()
+
+        with self._lock:
+            # Do not publish a result that an invalidate() raced past while we were loading
+            if generation == self._generation:
+                self._data = data
+                self._loaded_at = time.monotonic()
+        return data
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._data = None
+
+    def _load(self):
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT DISTINCT departure_airport FROM flight")
+            departure_airports = cursor.fetchall()
+
+            cursor.execute("SELECT DISTINCT arrival_airport FROM flight")
+            arrival_airports = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        return departure_airports, arrival_airports
@@ -1,8 +1,110 @@
+import os
+
+
+# Every setting can be overridden with an environment variable of the same name
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+
 # MySQL database configuration
-MYSQL_HOST = 'localhost'
-MYSQL_USER = 'root'
-MYSQL_PASSWORD = ''
-MYSQL_NAME = 'airline'
+MYSQL_HOST = _env('MYSQL_HOST', 'localhost')
+MYSQL_USER = _env('MYSQL_USER', 'root')
+MYSQL_PASSWORD = _env('MYSQL_PASSWORD', '')
+MYSQL_NAME = _env('MYSQL_NAME', 'airline')
+
+# Read replicas for the dashboards and reports, as comma-separated host or host:port entries
+# (same user, password and database as the primary); empty sends every read to MYSQL_HOST.
+# A replica more than REPLICA_MAX_LAG seconds behind is skipped, and a session that wrote reads
+# from the primary for that long. Replica health is re-checked every REPLICA_CHECK_INTERVAL seconds.
+MYSQL_REPLICAS = [host.strip() for host in _env('MYSQL_REPLICAS', '').split(',') if host.strip()]
+REPLICA_MAX_LAG = _env('REPLICA_MAX_LAG', 5, int)
+REPLICA_CHECK_INTERVAL = _env('REPLICA_CHECK_INTERVAL', 5, int)
 
 # Flask secret key
-SECRET_KEY = 'your_secret_key_here'
\ No newline at end of file
+SECRET_KEY = _env('SECRET_KEY', 'your_secret_key_here')
+
+# Connection pool settings
+DB_POOL_SIZE = _env('DB_POOL_SIZE', 10, int)              # Max open connections per process
+DB_POOL_TIMEOUT = _env('DB_POOL_TIMEOUT', 5, int)         # Seconds a request waits for a free connection
+DB_POOL_PING_AFTER = _env('DB_POOL_PING_AFTER', 30, int)  # Seconds idle before a connection is health-checked on checkout
+
+# Keyset pagination for flight listings and booking history
+PAGE_SIZE = _env('PAGE_SIZE', 25, int)
+MAX_PAGE_SIZE = _env('MAX_PAGE_SIZE', 100, int)
+
+# Seconds the airport lists for the search forms are cached
+AIRPORT_CACHE_TTL = _env('AIRPORT_CACHE_TTL', 300, int)
+
+# Memory for cached dashboard table fragments (fragments.py) per process, in MB of rendered HTML
+FRAGMENT_CACHE_MB = _env('FRAGMENT_CACHE_MB', 32, int)
+
+# Staff dashboards with more flights than this load passenger lists on demand
+MANIFEST_INLINE_LIMIT = _env('MANIFEST_INLINE_LIMIT', 200, int)
+
+# Statements slower than this are logged (normalized SQL and parameter types) and counted in /metrics
+SLOW_QUERY_MS = _env('SLOW_QUERY_MS', 200, int)
+
+# With several worker processes, /metrics adds up every worker's counts through files in
+# METRICS_DIR (metrics.py), which each worker rewrites every METRICS_FLUSH_INTERVAL seconds.
+# gunicorn.conf.py creates a private one per run when it is unset; empty reports one process only.
+METRICS_DIR = _env('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = _env('METRICS_FLUSH_INTERVAL', 5, int)
+
+# /metrics and /pool_stats are for logged-in airline staff unless this is set, e.g. for a
+# Prometheus scraper that reaches the app on a private network
+OPS_ENDPOINTS_PUBLIC = _env('OPS_ENDPOINTS_PUBLIC', False, bool)
+
+# HTTP caching of the public flight pages: seconds between re-reads of the schedule version
+# (how long another worker's change can go unnoticed) and the Cache-Control max-age for guests
+SCHEDULE_VERSION_TTL = _env('SCHEDULE_VERSION_TTL', 5, int)
+SCHEDULE_MAX_AGE = _env('SCHEDULE_MAX_AGE', 60, int)
+
+# Directory of the binary flight snapshot (snapshot.py) shared by the workers on a host through
+# mmap; it answers direct flight searches and flight details. The file is named after MYSQL_HOST
+# and MYSQL_NAME. Unset uses snapshots/ in the app's instance folder, created private to the app
+# user; it should not be a directory other users can write to. Empty disables it and those pages
+# query MySQL.
+FLIGHT_SNAPSHOT_DIR = _env('FLIGHT_SNAPSHOT_DIR', None)
+
+# Connecting-flight search (connections.py): shortest and longest allowed layover, and how many
+# 1- and 2-stop itineraries a search returns
+CONNECTION_MIN_MINUTES = _env('CONNECTION_MIN_MINUTES', 45, int)
+CONNECTION_MAX_LAYOVER_HOURS = _env('CONNECTION_MAX_LAYOVER_HOURS', 12, int)
+CONNECTION_RESULTS = _env('CONNECTION_RESULTS', 20, int)
+
+# Fare calendar (fares.py): default and largest +/- day window, seconds a route's fares are
+# cached, and how many routes are kept
+FARE_CALENDAR_DAYS = _env('FARE_CALENDAR_DAYS', 3, int)
+FARE_CALENDAR_MAX_DAYS = _env('FARE_CALENDAR_MAX_DAYS', 15, int)
+FARE_CACHE_TTL = _env('FARE_CACHE_TTL', 60, int)
+FARE_CACHE_ROUTES = _env('FARE_CACHE_ROUTES', 2000, int)
+
+# Most seats one customer or agent booking can take on a flight
+MAX_PARTY_SIZE = _env('MAX_PARTY_SIZE', 9, int)
+
+# Seat holds during checkout (holds.py): seconds a hold lasts, seconds between sweeps for
+# expired holds, and how many held seats one sweep transaction releases
+SEAT_HOLD_TTL = _env('SEAT_HOLD_TTL', 600, int)
+SEAT_HOLD_SWEEP_INTERVAL = _env('SEAT_HOLD_SWEEP_INTERVAL', 15, int)
+SEAT_HOLD_SWEEP_BATCH = _env('SEAT_HOLD_SWEEP_BATCH', 500, int)
+
+# bcrypt work factor for new hashes; logins rehash stored passwords made with a different one
+PASSWORD_HASH_ROUNDS = _env('PASSWORD_HASH_ROUNDS', 12, int)
+PASSWORD_HASH_WORKERS = _env('PASSWORD_HASH_WORKERS', 4, int)  # Threads hashing in parallel per process
+PASSWORD_HASH_QUEUE = _env('PASSWORD_HASH_QUEUE', 32, int)     # Operations allowed to wait for a worker before new ones are held back
+PASSWORD_HASH_TIMEOUT = _env('PASSWORD_HASH_TIMEOUT', 5, int)  # Seconds a request waits for a queue slot before getting a 503
+
+# Serving (python app.py, or gunicorn -c gunicorn.conf.py in production). Every worker process
+# has its own connection pool and caches, so WEB_THREADS should not exceed DB_POOL_SIZE.
+DEBUG = _env('FLASK_DEBUG', False, bool)
+WEB_BIND = _env('WEB_BIND', '0.0.0.0:5002')
+WEB_CONCURRENCY = _env('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1, int)  # Worker processes
+WEB_THREADS = _env('WEB_THREADS', 8, int)        # Request threads per worker
+PRELOAD_APP = _env('PRELOAD_APP', False, bool)   # Import and warm up once in the master, then fork
+WARM_UP = _env('WARM_UP', True, bool)            # Prime caches and templates before taking traffic
+DB_POOL_WARM = _env('DB_POOL_WARM', 2, int)      # Connections each worker opens at startup
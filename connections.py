@@ -0,0 +1,175 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from db import get_db_connection
+from flight_search import day_range
+
+Leg = namedtuple('Leg', 'airline_name flight_num departure_airport departure_time '
+                        'arrival_airport arrival_time price status')
+
+GRAPH_COLUMNS = """
+    airline_name, flight_num, departure_airport, departure_time,
+    arrival_airport, arrival_time, price, status
+"""
+
+
+# Departures from one airport (or on one route) ordered by time, so the flights leaving inside
+# a connection window are a bisect away. One list of (departure_time, airline_name, flight_num,
+# leg) entries, so a search reading it while update_flight() inserts never sees a torn pair.
+class _Departures:
+    def __init__(self):
+        self.entries = []
+
+    def add(self, leg):
+        insort(self.entries, (leg.departure_time, leg.airline_name, leg.flight_num, leg))
+
+    def remove(self, leg):
+        entry = (leg.departure_time, leg.airline_name, leg.flight_num, leg)
+        index = bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+
+    def between(self, start, end):
+        entries = self.entries
+        return [entry[3] for entry in entries[bisect_left(entries, (start,)):bisect_left(entries, (end,))]]
+
+
+NO_DEPARTURES = _Departures()
+
+
+# Time-expanded graph of every bookable flight (not cancelled, departing today or later),
+# indexed by departure airport and by (departure, arrival) route. It is rebuilt from MySQL
+# whenever the schedule version moves past the one it was built from; the worker that made
+# the change applies it in place instead (update_flight), so it skips the rebuild.
+class RouteGraph:
+    def __init__(self, schedule_version, min_connection_minutes, max_layover_hours):
+        self.schedule_version = schedule_version
+        self.min_connection = timedelta(minutes=min_connection_minutes)
+        self.max_layover = timedelta(hours=max_layover_hours)
+        self._lock = threading.Lock()
+        self._version = None
+        self._flights = {}
+        self._by_origin = defaultdict(_Departures)
+        self._by_route = defaultdict(_Departures)
+
+    @staticmethod
+    def _add(leg, flights, by_origin, by_route):
+        flights[(leg.airline_name, leg.flight_num)] = leg
+        by_origin[leg.departure_airport].add(leg)
+        by_route[(leg.departure_airport, leg.arrival_airport)].add(leg)
+
+    def _remove(self, key):
+        leg = self._flights.pop(key, None)
+        if leg is not None:
+            self._by_origin[leg.departure_airport].remove(leg)
+            self._by_route[(leg.departure_airport, leg.arrival_airport)].remove(leg)
+
+    # Rebuild from MySQL if the schedule changed since the last build
+    def refresh(self):
+        version = self.schedule_version.get()[0]
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version == version:
+                return
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    SELECT {GRAPH_COLUMNS} FROM flight
+                    WHERE status <> 'cancelled' AND departure_time >= CURDATE()
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.close()
+            flights, by_origin, by_route = {}, defaultdict(_Departures), defaultdict(_Departures)
+            for row in rows:
+                self._add(Leg(*row), flights, by_origin, by_route)
+            self._flights, self._by_origin, self._by_route = flights, by_origin, by_route
+            self._version = version
+
+    # Apply one committed flight change. `version` is the schedule version the change bumped to
+    # (schedule.bump); if another change landed in between, leave it to the next rebuild.
+    def update_flight(self, cursor, airline_name, flight_num, version):
+        flight_num = int(flight_num)
+        with self._lock:
+            if self._version is None or self._version != version - 1:
+                return
+            try:
+                cursor.execute(f"""
+                    SELECT {GRAPH_COLUMNS} FROM flight
+                    WHERE airline_name = %s AND flight_num = %s
+                """, (airline_name, flight_num))
+                row = cursor.fetchone()
+            except Exception:
+                # The change is already committed; let the next search rebuild instead of failing it
+                self._version = None
+                return
+            self._remove((airline_name, flight_num))
+            if row is not None:
+                leg = Leg(**row) if isinstance(row, dict) else Leg(*row)
+                if leg.status != 'cancelled':
+                    self._add(leg, self._flights, self._by_origin, self._by_route)
+            self._version = version
+
+    # Itineraries of min_stops + 1 to max_stops + 1 legs from source to destination, first leg
+    # departing on `date`, each connection at least min_connection and at most max_layover long.
+    # Ranked by total duration or by total price, best `limit` first. Raises ValueError on a bad date.
+    def search(self, source, destination, date, min_stops=0, max_stops=2, sort='duration', limit=20,
+               airline_name=None):
+        start, end = day_range(date)
+        self.refresh()
+
+        # Searches read without the lock; a rebuild swaps in new indexes instead of emptying these
+        by_origin, by_route = self._by_origin, self._by_route
+        itineraries = []
+
+        def allowed(leg):
+            return airline_name is None or leg.airline_name == airline_name
+
+        def onward(leg, departures):
+            return departures.between(leg.arrival_time + self.min_connection, leg.arrival_time + self.max_layover)
+
+        for first in by_origin.get(source, NO_DEPARTURES).between(start, end):
+            if not allowed(first):
+                continue
+            if first.arrival_airport == destination:
+                if min_stops == 0:
+                    itineraries.append((first,))
+                continue
+            if max_stops < 1:
+                continue
+            for second in onward(first, by_origin.get(first.arrival_airport, NO_DEPARTURES)):
+                if not allowed(second) or second.arrival_airport == source:
+                    continue
+                if second.arrival_airport == destination:
+                    if min_stops <= 1:
+                        itineraries.append((first, second))
+                    continue
+                if max_stops < 2:
+                    continue
+                for third in onward(second, by_route.get((second.arrival_airport, destination), NO_DEPARTURES)):
+                    if allowed(third):
+                        itineraries.append((first, second, third))
+
+        if sort == 'price':
+            rank = lambda legs: (sum(leg.price for leg in legs), legs[-1].arrival_time - legs[0].departure_time)
+        else:
+            rank = lambda legs: (legs[-1].arrival_time - legs[0].departure_time, sum(leg.price for leg in legs))
+        return [_itinerary(legs) for legs in heapq.nsmallest(limit, itineraries, key=rank)]
+
+
+# Row shape used by the templates and the JSON API
+def _itinerary(legs):
+    return {
+        'legs': [leg._asdict() for leg in legs],
+        'stops': len(legs) - 1,
+        'via': [leg.arrival_airport for leg in legs[:-1]],
+        'departure_time': legs[0].departure_time,
+        'arrival_time': legs[-1].arrival_time,
+        'duration_minutes': int((legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60),
+        'price': sum(leg.price for leg in legs),
+    }
@@ -0,0 +1,81 @@
+from pagination import keyset_condition, order_by, page_size, split_page
+
+
+# Keyset for the customer's booking history, newest first (see pagination.py)
+HISTORY_KEY = ('f.departure_time', 'f.airline_name', 'f.flight_num', 'p.ticket_id')
+
+
+# Everything customer_dashboard.html needs except the airport lists, in three round-trips:
+# the customer row, one conditional-aggregation query covering every spending window, and
+# one UNION ALL that returns the upcoming flights plus one page of booking history.
+def load_customer_dashboard(cursor, user_email, history_after=None, start_date=None, end_date=None):
+    cursor.execute("SELECT * FROM customer WHERE email = %s", (user_email,))
+    customer_info = cursor.fetchone()
+
+    # Spending per month for the last 6 months, the last year and the optional custom range.
+    # With no custom range the BETWEEN NULL AND NULL terms match nothing.
+    cursor.execute("""
+        SELECT DATE_FORMAT(p.purchase_date, '%Y-%m') AS month,
+               SUM(CASE WHEN p.purchase_date >= CURDATE() - INTERVAL 6 MONTH THEN f.price END) AS last_six_months,
+               SUM(CASE WHEN p.purchase_date >= CURDATE() - INTERVAL 1 YEAR THEN f.price END) AS last_year,
+               SUM(CASE WHEN p.purchase_date BETWEEN %s AND %s THEN f.price END) AS in_range
+        FROM purchases p
+        JOIN ticket t ON p.ticket_id = t.ticket_id
+        JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = f.airline_name
+        WHERE p.customer_email = %s
+          AND (p.purchase_date >= CURDATE() - INTERVAL 1 YEAR OR p.purchase_date BETWEEN %s AND %s)
+        GROUP BY month
+        ORDER BY month;
+    """, (start_date, end_date, user_email, start_date, end_date))
+    spending = cursor.fetchall()
+
+    last_six_months_spending = [{'month': row['month'], 'total_spent': row['last_six_months']}
+                                for row in spending if row['last_six_months'] is not None]
+    monthly_spending = [{'month': row['month'], 'total_spent': row['in_range']}
+                        for row in spending if row['in_range'] is not None]
+
+    # Upcoming flights and one page of past bookings, split apart by the `section` column
+    limit = page_size(None)
+    history_conditions = ["p.customer_email = %s", "f.status != 'upcoming'"]
+    history_params = [user_email]
+    condition, condition_params = keyset_condition(HISTORY_KEY, history_after, descending=True)
+    if condition:
+        history_conditions.append(condition)
+        history_params.extend(condition_params)
+
+    columns = """
+        f.airline_name, f.flight_num, f.departure_time, f.arrival_time, f.departure_airport,
+        f.arrival_airport, f.status, p.purchase_date, f.price, p.ticket_id
+        FROM flight f
+        JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
+        JOIN purchases p ON t.ticket_id = p.ticket_id
+    """
+    cursor.execute(f"""
+        (SELECT 'upcoming' AS section, {columns}
+         WHERE p.customer_email = %s AND f.status = 'upcoming')
+        UNION ALL
+        (SELECT 'history' AS section, {columns}
+         WHERE {' AND '.join(history_conditions)}
+         ORDER BY {order_by(HISTORY_KEY, descending=True)}
+         LIMIT %s)
+    """, (user_email, *history_params, limit + 1))
+
+    upcoming_flights, booking_history = [], []
+    for row in cursor.fetchall():
+        (upcoming_flights if row.pop('section') == 'upcoming' else booking_history).append(row)
+
+    # UNION ALL does not promise to keep the inner ORDER BY
+    booking_history.sort(key=lambda row: tuple(row[column.split('.')[-1]] for column in HISTORY_KEY), reverse=True)
+    booking_history, history_next = split_page(booking_history, HISTORY_KEY, limit)
+
+    return {
+        'customer_info': customer_info,
+        'upcoming_flights': upcoming_flights,
+        'booking_history': booking_history,
+        'history_next': history_next,
+        'last_six_months_spending': last_six_months_spending,
+        'total_spent_last_six_months': sum(row['total_spent'] for row in last_six_months_spending),
+        'total_spent_last_year': sum(row['last_year'] or 0 for row in spending),
+        'monthly_spending': monthly_spending,
+        'total_spent_range': sum(row['total_spent'] for row in monthly_spending),
+    }
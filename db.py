@@ -0,0 +1,343 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from flask import current_app, g, has_request_context, session
+import mysql.connector
+from metrics import TimedCursor
+
+logger = logging.getLogger('airline.replicas')
+
+
+# Errors that can leave a connection unusable (lost or reset link, server gone away), as
+# opposed to a bad statement or a constraint violation
+BROKEN_CONNECTION_ERRORS = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+
+
+# Raised when no pooled connection frees up within the wait timeout
+class PoolTimeout(Exception):
+    pass
+
+
+# Bounded pool of MySQL connections shared by every request in this process
+class ConnectionPool:
+    def __init__(self, size, timeout, ping_after, slow_query_ms, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.connect_args = connect_args
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._opened = 0
+
+        # Counters reported by stats()
+        self.in_use = 0
+        self.waiters = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _connect(self):
+        # consume_results keeps a half-read cursor from poisoning the next request
+        return mysql.connector.connect(consume_results=True, **self.connect_args)
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                self.waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiters -= 1
+            self.in_use += 1
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used > self.ping_after and not conn.is_connected():
+                # Connection went stale while idle (server restart, wait_timeout), open a fresh one
+                self._discard(conn)
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self.in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    # Return a connection to the idle list, or close it if `broken` (it raised a connection
+    # error) or its open transaction cannot be rolled back
+    def release(self, conn, broken=False):
+        healthy = not broken
+        try:
+            # End any open transaction so the next borrower does not inherit its snapshot or locks
+            if healthy and conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self.in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._opened -= 1
+                self._discard(conn)
+            self._cond.notify()
+
+    # Open up to `count` connections ahead of traffic so the first requests skip the handshake
+    def warm(self, count):
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    # Close idle connections, e.g. in a pre-fork master so workers never share a socket
+    def close(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'waiters': self.waiters,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'avg_checkout_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'max_checkout_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+# One read replica: its pool and the last health check's verdict
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = None
+        self.checked_at = None
+        self.checking = False
+
+
+# Read replicas used round-robin by get_read_connection(). A replica is skipped while it is
+# unreachable, not replicating, or more than `max_lag` seconds behind the primary. Health is
+# re-checked at most every `check_interval` seconds, by whichever request finds it due.
+class ReplicaSet:
+    def __init__(self, replicas, max_lag, check_interval):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def _lag(self, conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.Error:
+                # MySQL before 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            return None
+        return row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+
+    def _check(self, replica):
+        with self._lock:
+            due = replica.checked_at is None or time.monotonic() - replica.checked_at >= self.check_interval
+            if not due or replica.checking:
+                return
+            replica.checking = True
+        lag = None
+        try:
+            conn = replica.pool.acquire()
+            broken = True
+            try:
+                lag = self._lag(conn)
+                broken = False
+            finally:
+                replica.pool.release(conn, broken)
+        except Exception:
+            logger.warning('Replica %s failed its health check', replica.name, exc_info=True)
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.warning('Replica %s is now %s (lag %s s)', replica.name, 'in use' if healthy else 'skipped', lag)
+        with self._lock:
+            replica.healthy, replica.lag = healthy, lag
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+
+    # (pool, connection) from the next healthy replica, or (None, None) if there is none
+    def acquire(self):
+        start = next(self._next)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            self._check(replica)
+            if not replica.healthy:
+                continue
+            try:
+                return replica.pool, replica.pool.acquire()
+            except PoolTimeout:
+                continue
+            except Exception:
+                logger.warning('Replica %s refused a connection', replica.name, exc_info=True)
+                with self._lock:
+                    replica.healthy = False
+                    replica.checked_at = time.monotonic()
+        return None, None
+
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def stats(self):
+        return [{'name': replica.name, 'healthy': replica.healthy, 'lag': replica.lag, **replica.pool.stats()}
+                for replica in self.replicas]
+
+
+# Connection handed out to route code. Routes still call close() when they are done; for the
+# request-scoped connection that is a no-op and the real release happens on teardown.
+class PooledConnection:
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self.broken = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    # A connection error on any statement keeps the connection out of the pool on release
+    def _check_error(self, error):
+        if isinstance(error, BROKEN_CONNECTION_ERRORS):
+            self.broken = True
+
+    # Cursors count and time their statements against the current request
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._pool.slow_query_seconds, self._check_error)
+
+    # A write on the primary sends this session's reads to the primary for the staleness bound,
+    # so the page a purchase redirects to already shows it
+    def commit(self):
+        try:
+            self._conn.commit()
+        except Exception as e:
+            self._check_error(e)
+            raise
+        replicas = current_app.extensions.get('db_replicas') if has_request_context() else None
+        if replicas is not None and self._pool is current_app.extensions['db_pool']:
+            g.db_wrote = True
+            session['primary_until'] = time.time() + replicas.max_lag
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        if self._conn is not None:
+            self._pool.release(self._conn, self.broken)
+            self._conn = None
+
+
+# One connection per request, checked out lazily on first use and attached to flask.g
+def get_db_connection():
+    conn = g.get('db_conn')
+    if conn is None:
+        pool = current_app.extensions['db_pool']
+        conn = g.db_conn = PooledConnection(pool, pool.acquire(), request_scoped=True)
+    return conn
+
+
+# Connection for a read-only route: a healthy replica when any are configured, otherwise the
+# primary. The primary also serves sessions that wrote within the staleness bound and requests
+# that already wrote, so nobody reads a replica that may not have their change yet.
+def get_read_connection():
+    conn = g.get('db_read_conn')
+    if conn is not None:
+        return conn
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is None or g.get('db_wrote') or session.get('primary_until', 0) > time.time():
+        return get_db_connection()
+    pool, raw = replicas.acquire()
+    if raw is None:
+        return get_db_connection()
+    conn = g.db_read_conn = PooledConnection(pool, raw, request_scoped=True)
+    return conn
+
+
+# Return the request's connections to their pools
+def close_db_connection(exc=None):
+    for name in ('db_conn', 'db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.release()
+
+
+# Give the app a fresh pool, plus one per read replica ("host" or "host:port" entries in
+# `replicas`). Called again in each worker after a fork, since connections and pool locks
+# cannot be shared between processes.
+def init_app(app, host, user, password, database, size, timeout, ping_after, slow_query_ms,
+             replicas=(), replica_max_lag=5, replica_check_interval=5):
+    if 'db_pool' not in app.extensions:
+        app.teardown_appcontext(close_db_connection)
+    app.extensions['db_pool'] = ConnectionPool(size, timeout, ping_after, slow_query_ms,
+                                               host=host, user=user, password=password, database=database)
+
+    app.extensions.pop('db_replicas', None)
+    if replicas:
+        members = []
+        for name in replicas:
+            replica_host, _, port = name.partition(':')
+            # A replica that stops answering should cost a request `timeout` seconds at most
+            pool = ConnectionPool(size, timeout, ping_after, slow_query_ms, host=replica_host, port=int(port or 3306),
+                                  user=user, password=password, database=database, connection_timeout=timeout)
+            members.append(Replica(name, pool))
+        app.extensions['db_replicas'] = ReplicaSet(members, replica_max_lag, replica_check_interval)
@@ -0,0 +1,63 @@
+import random
+from sales import ROLLUP_SLOTS
+
+
+# Per-(airline, arrival airport, month) counters in destination_counts
+# (resources/destination_counts.sql): flights scheduled to depart that month, and tickets sold
+# on them. create_flight() and the purchase paths keep them current, so the top destinations
+# page groups a few counter rows instead of the flight table. Like sales_rollup, each bucket
+# is spread over ROLLUP_SLOTS rows to keep purchases on one popular route from queueing.
+
+
+# Count a newly created flight. Call before committing the flight.
+def record_flight(cursor, airline_name, flight_num):
+    cursor.execute("""
+        INSERT INTO destination_counts (airline_name, arrival_airport, flight_month, slot, flights, tickets_sold)
+        SELECT airline_name, arrival_airport, DATE_FORMAT(departure_time, '%Y-%m-01'), %s, 1, 0
+        FROM flight
+        WHERE airline_name = %s AND flight_num = %s
+        ON DUPLICATE KEY UPDATE flights = flights + 1
+    """, (random.randrange(ROLLUP_SLOTS), airline_name, flight_num))
+
+
+# Count `tickets` tickets sold on a flight. Call before committing the purchase.
+def record_tickets(cursor, airline_name, flight_num, tickets=1):
+    cursor.execute("""
+        INSERT INTO destination_counts (airline_name, arrival_airport, flight_month, slot, flights, tickets_sold)
+        SELECT airline_name, arrival_airport, DATE_FORMAT(departure_time, '%Y-%m-01'), %s, 0, %s
+        FROM flight
+        WHERE airline_name = %s AND flight_num = %s
+        ON DUPLICATE KEY UPDATE tickets_sold = tickets_sold + VALUES(tickets_sold)
+    """, (random.randrange(ROLLUP_SLOTS), tickets, airline_name, flight_num))
+
+
+def rebuild(cursor):
+    cursor.execute("DELETE FROM destination_counts")
+    cursor.execute("""
+        INSERT INTO destination_counts (airline_name, arrival_airport, flight_month, slot, flights, tickets_sold)
+        SELECT f.airline_name, f.arrival_airport, DATE_FORMAT(f.departure_time, '%Y-%m-01') AS flight_month, 0,
+               COUNT(DISTINCT f.flight_num), COUNT(p.ticket_id)
+        FROM flight f
+        LEFT JOIN ticket t ON t.airline_name = f.airline_name AND t.flight_num = f.flight_num
+        LEFT JOIN purchases p ON p.ticket_id = t.ticket_id
+        GROUP BY f.airline_name, f.arrival_airport, flight_month
+    """)
+    return cursor.rowcount
+
+
+# Top `limit` arrival airports of an airline for flights departing from since_month (a date,
+# first of a month) onwards, ranked by number of flights or, with by='tickets', by tickets sold.
+def top_destinations(cursor, airline_name, since_month, limit=3, by='flights'):
+    ranking = 'num_flights' if by == 'flights' else 'tickets_sold'
+    cursor.execute(f"""
+        SELECT d.arrival_airport, a.airport_city,
+               SUM(d.flights) AS num_flights, SUM(d.tickets_sold) AS tickets_sold
+        FROM destination_counts d
+        JOIN airport a ON d.arrival_airport = a.airport_name
+        WHERE d.airline_name = %s AND d.flight_month >= %s
+        GROUP BY d.arrival_airport, a.airport_city
+        HAVING {ranking} > 0
+        ORDER BY {ranking} DESC
+        LIMIT %s
+    """, (airline_name, since_month, limit))
+    return cursor.fetchall()
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+
+# Rows fetched from the server per round-trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+# Each export selects an airline's rows with a date column in [start, end + 1 day)
+EXPORT_QUERIES = {
+    'purchases': """
+        SELECT p.ticket_id, p.customer_email, p.booking_agent_id, p.purchase_date,
+               f.airline_name, f.flight_num, f.departure_airport, f.arrival_airport, f.departure_time, f.price
+        FROM purchases p
+        JOIN ticket t ON p.ticket_id = t.ticket_id
+        JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = f.airline_name
+        WHERE t.airline_name = %s AND p.purchase_date >= %s AND p.purchase_date < %s
+        ORDER BY p.purchase_date, p.ticket_id
+    """,
+    'manifests': """
+        SELECT f.airline_name, f.flight_num, f.departure_time, f.departure_airport, f.arrival_airport,
+               t.ticket_id, c.name, c.email
+        FROM flight f
+        JOIN ticket t ON f.flight_num = t.flight_num AND f.airline_name = t.airline_name
+        JOIN purchases p ON t.ticket_id = p.ticket_id
+        JOIN customer c ON p.customer_email = c.email
+        WHERE f.airline_name = %s AND f.departure_time >= %s AND f.departure_time < %s
+        ORDER BY f.departure_time, f.flight_num, t.ticket_id
+    """,
+    'flights': """
+        SELECT airline_name, flight_num, departure_airport, departure_time, arrival_airport,
+               arrival_time, price, status, airplane_id
+        FROM flight
+        WHERE airline_name = %s AND departure_time >= %s AND departure_time < %s
+        ORDER BY departure_time, flight_num
+    """,
+}
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+# Half-open range for 'YYYY-MM-DD' start/end dates, end inclusive. Raises ValueError.
+def date_range(start, end):
+    start_day = date.fromisoformat(start)
+    end_day = date.fromisoformat(end)
+    if end_day < start_day:
+        raise ValueError('end is before start')
+    return start_day, end_day + timedelta(days=1)
+
+
+# Stream one export as encoded chunks. The cursor is unbuffered, so rows come off the
+# server EXPORT_BATCH_SIZE at a time and memory stays flat however large the export is.
+def stream_export(conn, dataset, airline_name, start, end, export_format):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(EXPORT_QUERIES[dataset], (airline_name, start, end))
+        columns = cursor.column_names
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(columns)
+
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            if export_format == 'csv':
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        cursor.close()
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from db import get_db_connection
+
+# Every upcoming, not cancelled flight on one route with its unsold seat count, in one grouped
+# query (idx_flight_route for the flights, the available_ticket primary key for the counts)
+ROUTE_FARES_QUERY = """
+    SELECT f.airline_name, f.flight_num, DATE(f.departure_time) AS day, f.price,
+           COUNT(a.ticket_id) AS seats_left
+    FROM flight f
+    LEFT JOIN available_ticket a ON a.airline_name = f.airline_name AND a.flight_num = f.flight_num
+    WHERE f.departure_airport = %s AND f.arrival_airport = %s
+      AND f.departure_time >= CURDATE() AND f.status <> 'cancelled'
+    GROUP BY f.airline_name, f.flight_num, day, f.price
+"""
+
+
+# Process-wide route -> flight -> (day, price, seats_left) grid behind the fare calendar.
+# Routes load on first use, expire after `ttl` seconds and are evicted least recently used
+# beyond `max_routes`. Purchases decrement seats in place and new or changed flights drop their
+# route, so this worker's own writes show up at once and other workers' within `ttl`.
+class FareCalendar:
+    def __init__(self, ttl, max_routes):
+        self.ttl = ttl
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        self._routes = OrderedDict()  # (source, destination) -> (loaded_at, {(airline, flight_num): [day, price, seats_left]})
+        self._flight_routes = {}      # (airline, flight_num) -> (source, destination)
+
+    def _cached(self, route):
+        entry = self._routes.get(route)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            return None
+        self._routes.move_to_end(route)
+        return entry[1]
+
+    def _drop(self, route):
+        entry = self._routes.pop(route, None)
+        if entry is not None:
+            for flight in entry[1]:
+                self._flight_routes.pop(flight, None)
+
+    def _load(self, source, destination):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(ROUTE_FARES_QUERY, (source, destination))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        return {(airline_name, flight_num): [day, price, seats_left]
+                for airline_name, flight_num, day, price, seats_left in rows}
+
+    # Lowest fare with a seat left, total seats left and number of flights for each day in
+    # [start_day, end_day]; days without flights have min_price None
+    def get(self, source, destination, start_day, end_day):
+        route = (source, destination)
+        with self._lock:
+            flights = self._cached(route)
+
+        if flights is None:
+            flights = self._load(source, destination)
+            with self._lock:
+                self._drop(route)
+                self._routes[route] = (time.monotonic(), flights)
+                for flight in flights:
+                    self._flight_routes[flight] = route
+                while len(self._routes) > self.max_routes:
+                    self._drop(next(iter(self._routes)))
+
+        days = {}
+        with self._lock:
+            for day, price, seats_left in flights.values():
+                if start_day <= day <= end_day:
+                    summary = days.setdefault(day, {'min_price': None, 'seats_left': 0, 'flights': 0})
+                    summary['flights'] += 1
+                    summary['seats_left'] += seats_left
+                    if seats_left > 0 and (summary['min_price'] is None or price < summary['min_price']):
+                        summary['min_price'] = price
+
+        calendar = []
+        day = start_day
+        while day <= end_day:
+            calendar.append({'date': day.isoformat(),
+                             **days.get(day, {'min_price': None, 'seats_left': 0, 'flights': 0})})
+            day += timedelta(days=1)
+        return calendar
+
+    # Called after a purchase commits
+    def record_sale(self, airline_name, flight_num, tickets=1):
+        flight = (airline_name, int(flight_num))
+        with self._lock:
+            route = self._flight_routes.get(flight)
+            if route is not None:
+                fare = self._routes[route][1][flight]
+                fare[2] = max(0, fare[2] - tickets)
+
+    # Called after held seats go back on sale
+    def record_release(self, airline_name, flight_num, tickets=1):
+        flight = (airline_name, int(flight_num))
+        with self._lock:
+            route = self._flight_routes.get(flight)
+            if route is not None:
+                self._routes[route][1][flight][2] += tickets
+
+    # Called after a flight is created on, or changed on, a route
+    def invalidate_route(self, source, destination):
+        with self._lock:
+            self._drop((source, destination))
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+
+# Columns returned by flight searches (everything search_results.html and the JSON API use)
+SEARCH_COLUMNS = """
+    airline_name, flight_num, departure_airport, departure_time,
+    arrival_airport, arrival_time, price, status, airplane_id
+"""
+
+
+# Turn a 'YYYY-MM-DD' search date into the half-open range [day, next day).
+# Comparing departure_time against a range keeps the column bare so MySQL can use
+# idx_flight_route (departure_airport, arrival_airport, departure_time, airline_name).
+def day_range(date):
+    start = datetime.strptime(date, '%Y-%m-%d')
+    return start, start + timedelta(days=1)
+
+
+# Direct flights from source to destination departing on `date`, optionally limited to one
+# airline (booking agents only see the airline they work for). Raises ValueError on a bad date.
+def search_flights(cursor, source, destination, date, airline_name=None):
+    start, end = day_range(date)
+
+    query = f"""
+        SELECT {SEARCH_COLUMNS}
+        FROM flight
+        WHERE departure_airport = %s
+          AND arrival_airport = %s
+          AND departure_time >= %s
+          AND departure_time < %s
+    """
+    params = [source, destination, start, end]
+
+    if airline_name is not None:
+        query += " AND airline_name = %s"
+        params.append(airline_name)
+
+    query += " ORDER BY departure_time"
+    cursor.execute(query, tuple(params))
+    return cursor.fetchall()
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from flask import current_app, g
+from markupsafe import Markup
+from db import get_read_connection
+import metrics
+
+fragment_lookups = metrics.register(metrics.Counter(
+    'template_fragment_cache_total', 'Cached template fragment lookups.', ('fragment', 'result')))
+
+
+# Rendered template fragments, least recently used evicted once their total length passes
+# `max_chars`. Keys carry the data versions they were rendered at, so a bump makes the old
+# entries unreachable and they age out.
+class FragmentCache:
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        if len(html) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = html
+            self.size += len(html)
+            while self.size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+# Mark entities as changed inside the caller's transaction
+def bump(cursor, *entities):
+    cursor.executemany("""
+        INSERT INTO data_version (entity, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, [(entity,) for entity in entities])
+
+
+# Versions of `entities`, read once per request on the connection the page's data came from,
+# so both see the same snapshot (a replica's, if the route read from one)
+def _versions(entities):
+    versions = g.setdefault('data_versions', {})
+    missing = [entity for entity in entities if entity not in versions]
+    if missing:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        try:
+            placeholders = ', '.join(['%s'] * len(missing))
+            cursor.execute(f"SELECT entity, version FROM data_version WHERE entity IN ({placeholders})",
+                           tuple(missing))
+            versions.update(dict.fromkeys(missing, 0))
+            versions.update(cursor.fetchall())
+        finally:
+            cursor.close()
+            conn.close()
+    return tuple(versions[entity] for entity in entities)
+
+
+# Template helper: the block is rendered only when no copy exists for these entities' current
+# versions and `key` (anything else the block depends on, e.g. filters or permissions):
+#     {% call cached_fragment('staff_flights', ['airline:' ~ airline_name], is_operator) %}...{% endcall %}
+def cached_fragment(name, entities, *key, caller):
+    cache = current_app.extensions['fragment_cache']
+    cache_key = (name, tuple(entities), _versions(entities), tuple(str(part) for part in key))
+    html = cache.get(cache_key)
+    if html is not None:
+        fragment_lookups.inc((name, 'hit'))
+        return Markup(html)
+    fragment_lookups.inc((name, 'miss'))
+    html = str(caller())
+    cache.set(cache_key, html)
+    return Markup(html)
+
+
+def init_app(app, max_chars):
+    cache = app.extensions['fragment_cache'] = FragmentCache(max_chars)
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+    metrics.register(metrics.Gauge('template_fragment_cache_chars', 'Characters of rendered fragments cached.',
+                                   lambda: cache.size))
@@ -0,0 +1,61 @@
+# gunicorn -c gunicorn.conf.py
+#
+# WEB_CONCURRENCY worker processes with WEB_THREADS request threads each (see config.py).
+# Every worker has its own connection pool of DB_POOL_SIZE connections, so the database sees up
+# to WEB_CONCURRENCY * DB_POOL_SIZE connections. With PRELOAD_APP=1 the app is imported and
+# warmed up once in the master and shared copy-on-write; each worker then opens its own pool.
+import os
+import shutil
+import tempfile
+
+# Workers add up their /metrics through files in METRICS_DIR (metrics.py). Unless one is given,
+# use a new private directory for this run, so totals start from zero and no other user can write it.
+_metrics_dir = None
+if 'METRICS_DIR' not in os.environ:
+    _metrics_dir = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='airline-metrics-')
+
+from config import WEB_BIND, WEB_CONCURRENCY, WEB_THREADS, PRELOAD_APP
+
+wsgi_app = 'wsgi:app'
+bind = WEB_BIND
+workers = WEB_CONCURRENCY
+threads = WEB_THREADS
+worker_class = 'gthread'
+preload_app = PRELOAD_APP
+timeout = 30
+graceful_timeout = 30
+accesslog = '-'
+
+
+# The master only warms up; close its connections so no worker inherits a shared socket, and
+# stop its seat hold sweeper (each worker runs its own)
+def when_ready(server):
+    if preload_app:
+        from app import app
+        app.extensions['db_pool'].close()
+        if 'db_replicas' in app.extensions:
+            app.extensions['db_replicas'].close()
+        app.extensions['hold_sweeper'].stop()
+        import metrics
+        metrics.close_worker()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import app, init_worker
+        import metrics
+        metrics.reset()
+        init_worker(app)
+
+
+# Drop counts a previous run left in a METRICS_DIR given in the environment
+def on_starting(server):
+    if _metrics_dir is None and os.environ['METRICS_DIR']:
+        for name in os.listdir(os.environ['METRICS_DIR']):
+            if name.endswith('.json'):
+                os.remove(os.path.join(os.environ['METRICS_DIR'], name))
+
+
+def on_exit(server):
+    if _metrics_dir is not None:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
@@ -0,0 +1,181 @@
+import heapq
+import secrets
+import threading
+import time
+from collections import Counter
+from db import get_db_connection
+import metrics
+import seats
+
+held_seats = metrics.register(metrics.Counter(
+    'seat_hold_seats_total', 'Seats put on hold, and how their holds ended.', ('outcome',)))
+
+
+# Hold `count` seats on a flight for `ttl` seconds: take them off the free-list (so other
+# buyers no longer see them) and record who holds them until when. Returns the hold_id, or
+# None if fewer than `count` seats are free. Runs inside the caller's transaction.
+def create_hold(cursor, airline_name, flight_num, count, customer_email, booking_agent_id, ttl):
+    ticket_ids = seats.allocate_seats(cursor, airline_name, flight_num, count)
+    if ticket_ids is None:
+        return None
+
+    hold_id = secrets.token_hex(16)
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, UTC_TIMESTAMP() + INTERVAL %s SECOND)'] * len(ticket_ids))
+    params = []
+    for ticket_id in ticket_ids:
+        params.extend((ticket_id, hold_id, airline_name, flight_num, customer_email, booking_agent_id, ttl))
+    cursor.execute(f"""
+        INSERT INTO seat_hold (ticket_id, hold_id, airline_name, flight_num, customer_email,
+                               booking_agent_id, expires_at)
+        VALUES {values}
+    """, tuple(params))
+    return hold_id
+
+
+# The hold's flight, buyer, seats and seconds left (None once it has expired or is gone).
+# With lock=True its rows stay locked until the caller's transaction ends.
+def get_hold(cursor, hold_id, lock=False):
+    cursor.execute(f"""
+        SELECT h.ticket_id, h.airline_name, h.flight_num, h.customer_email, h.booking_agent_id,
+               h.expires_at, TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), h.expires_at) AS seconds_left,
+               f.departure_airport, f.arrival_airport, f.departure_time, f.price
+        FROM seat_hold h
+        JOIN flight f ON h.airline_name = f.airline_name AND h.flight_num = f.flight_num
+        WHERE h.hold_id = %s AND h.expires_at > UTC_TIMESTAMP()
+        ORDER BY h.ticket_id
+        {'FOR UPDATE' if lock else ''}
+    """, (hold_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    hold = {key: rows[0][key] for key in ('airline_name', 'flight_num', 'customer_email', 'booking_agent_id',
+                                          'expires_at', 'seconds_left', 'departure_airport',
+                                          'arrival_airport', 'departure_time', 'price')}
+    hold['hold_id'] = hold_id
+    hold['ticket_ids'] = [row['ticket_id'] for row in rows]
+    return hold
+
+
+# Turn a locked hold (get_hold(..., lock=True)) into purchases rows. Runs inside the caller's transaction.
+def confirm_hold(cursor, hold):
+    seats.insert_purchases(cursor, hold['ticket_ids'], hold['customer_email'], hold['booking_agent_id'])
+    cursor.execute("DELETE FROM seat_hold WHERE hold_id = %s", (hold['hold_id'],))
+
+
+# Give a hold's seats back to the free-list. Runs inside the caller's transaction. A seat that is
+# already there (e.g. left behind by a data reload) is a no-op update on its primary key rather
+# than an error; unlike INSERT IGNORE, any other failure (a foreign key, a bad value) still raises.
+def release_hold(cursor, hold_id):
+    cursor.execute("""
+        INSERT INTO available_ticket (ticket_id, airline_name, flight_num)
+        SELECT ticket_id, airline_name, flight_num FROM seat_hold WHERE hold_id = %s
+        ON DUPLICATE KEY UPDATE ticket_id = available_ticket.ticket_id
+    """, (hold_id,))
+    cursor.execute("DELETE FROM seat_hold WHERE hold_id = %s", (hold_id,))
+
+
+# Release up to `batch_size` expired held seats, oldest first, and return their (ticket_id,
+# airline_name, flight_num) rows. The range scan on idx_seat_hold_expires touches expired rows
+# only; SKIP LOCKED leaves seats that a checkout is confirming right now, and lets every
+# worker's sweeper run at once. A seat already back on the free-list is skipped (as in
+# release_hold) and its hold row still deleted, so one stale row cannot roll back the batch and
+# block every later sweep.
+def sweep_expired(cursor, batch_size):
+    cursor.execute("""
+        SELECT ticket_id, airline_name, flight_num FROM seat_hold
+        WHERE expires_at <= UTC_TIMESTAMP()
+        ORDER BY expires_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (batch_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return rows
+
+    ticket_ids = [row[0] for row in rows]
+    cursor.executemany("""
+        INSERT INTO available_ticket (ticket_id, airline_name, flight_num) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE ticket_id = available_ticket.ticket_id
+    """, rows)
+    placeholders = ', '.join(['%s'] * len(ticket_ids))
+    cursor.execute(f"DELETE FROM seat_hold WHERE ticket_id IN ({placeholders})", tuple(ticket_ids))
+    return rows
+
+
+# Background thread that returns expired holds to the free-list. It keeps a heap of the expiry
+# times of holds made by this process and wakes when the earliest is due, and otherwise every
+# `interval` seconds to pick up holds left behind by other or restarted workers.
+# on_release(airline_name, flight_num, tickets) runs after each committed batch.
+class HoldSweeper:
+    def __init__(self, app, interval, batch_size, on_release=None):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_release = on_release
+        self._cond = threading.Condition()
+        self._due = []  # time.monotonic() deadlines
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='hold-sweeper', daemon=True)
+        self._thread.start()
+
+    # Wake the sweeper when a hold created `ttl` seconds from now expires
+    def schedule(self, ttl):
+        with self._cond:
+            heapq.heappush(self._due, time.monotonic() + ttl + 1)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _wait(self):
+        with self._cond:
+            interval_at = time.monotonic() + self.interval
+            while True:
+                wake_at = min(self._due[0], interval_at) if self._due else interval_at
+                timeout = wake_at - time.monotonic()
+                if timeout <= 0 or self._stopped:
+                    break
+                self._cond.wait(timeout)
+            now = time.monotonic()
+            while self._due and self._due[0] <= now:
+                heapq.heappop(self._due)
+
+    def sweep(self):
+        with self.app.app_context():
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                while True:
+                    rows = sweep_expired(cursor, self.batch_size)
+                    conn.commit()
+                    held_seats.inc(('expired',), len(rows))
+                    if self.on_release is not None:
+                        flights = Counter((airline_name, flight_num) for _, airline_name, flight_num in rows)
+                        for (airline_name, flight_num), tickets in flights.items():
+                            self.on_release(airline_name, flight_num, tickets)
+                    if len(rows) < self.batch_size:
+                        break
+            except Exception:
+                conn.rollback()
+                self.app.logger.exception('Seat hold sweep failed')
+            finally:
+                cursor.close()
+                conn.close()
+
+    def _run(self):
+        while True:
+            self._wait()
+            if self._stopped:
+                return
+            self.sweep()
+
+
+# Start this process's sweeper, stopping the one it replaces. Called again in each worker after
+# a fork (threads do not survive it); gunicorn.conf.py stops the preloading master's.
+def init_app(app, interval, batch_size, on_release=None):
+    sweeper = app.extensions.get('hold_sweeper')
+    if sweeper is not None:
+        sweeper.stop()
+    app.extensions['hold_sweeper'] = HoldSweeper(app, interval, batch_size, on_release)
@@ -0,0 +1,32 @@
+# Passenger manifests (who bought a ticket on which flight) for an airline's flights
+
+# Flight numbers per IN (...) list, keeps each statement and its parameter list bounded
+MANIFEST_CHUNK_SIZE = 500
+
+
+# Passengers of many flights at once: {flight_num: [{'name', 'email'}, ...]}, one query per
+# MANIFEST_CHUNK_SIZE flights instead of one per flight. Every requested flight gets a list.
+def fetch_manifests(cursor, airline_name, flight_nums):
+    flight_nums = list(dict.fromkeys(flight_nums))
+    manifests = {flight_num: [] for flight_num in flight_nums}
+
+    for start in range(0, len(flight_nums), MANIFEST_CHUNK_SIZE):
+        chunk = flight_nums[start:start + MANIFEST_CHUNK_SIZE]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT t.flight_num, c.name, c.email
+            FROM purchases p
+            JOIN ticket t ON p.ticket_id = t.ticket_id
+            JOIN customer c ON p.customer_email = c.email
+            WHERE t.airline_name = %s AND t.flight_num IN ({placeholders})
+            ORDER BY t.flight_num, c.name
+        """, (airline_name, *chunk))
+        for row in cursor.fetchall():
+            manifests[row['flight_num']].append({'name': row['name'], 'email': row['email']})
+
+    return manifests
+
+
+# Passengers of a single flight
+def fetch_manifest(cursor, airline_name, flight_num):
+    return fetch_manifests(cursor, airline_name, [flight_num])[flight_num]
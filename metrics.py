@@ -0,0 +1,339 @@
+import glob
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from flask import g, has_request_context, request
+
+slow_query_log = logging.getLogger('airline.slow_query')
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 50, 100, 250)
+
+
+# Prometheus-style histogram keyed by a tuple of label values
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def values(self):
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    # Add up series from several processes (see SharedMetrics)
+    @staticmethod
+    def merge(total, values):
+        for labels, series in values.items():
+            current = total.get(labels)
+            total[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        series = sorted((self.values() if values is None else values).items())
+        for labels, values in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-1]}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(total, values):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted((self.values() if values is None else values).items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return '\n'.join(lines)
+
+
+# Value read at scrape time from a callback. It describes one process, so with several workers
+# each live worker's value is shown under its own `worker` label (its pid).
+class Gauge:
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        if values is None:
+            lines.append(f'{self.name} {self.read()}')
+        for worker, value in sorted((values or {}).items()):
+            lines.append(f'{self.name}{{worker="{worker}"}} {value}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                             ('endpoint', 'method'), LATENCY_BUCKETS)
+request_queries = Histogram('http_request_db_queries', 'SQL statements executed per request.',
+                            ('endpoint', 'method'), QUERY_COUNT_BUCKETS)
+request_db_time = Histogram('http_request_db_seconds', 'Time spent in SQL statements per request.',
+                            ('endpoint', 'method'), LATENCY_BUCKETS)
+responses = Counter('http_responses_total', 'Responses sent, by status code.', ('endpoint', 'method', 'status'))
+slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.', ('endpoint',))
+
+METRICS = {metric.name: metric for metric in (request_duration, request_queries, request_db_time, responses,
+                                                slow_queries)}
+
+
+# Add a metric to /metrics, replacing any earlier one with the same name
+def register(metric):
+    METRICS[metric.name] = metric
+    return metric
+
+
+# Collapse whitespace so multi-line statements log on one line
+def normalize_sql(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+# Parameter types and sizes, never their values (emails, passwords)
+def param_shape(params):
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+# Cursor proxy that counts and times statements against the current request
+class TimedCursor:
+    def __init__(self, cursor, slow_query_seconds, on_error=None):
+        self._cursor = cursor
+        self._slow_query_seconds = slow_query_seconds
+        self._on_error = on_error
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _record(self, sql, params, elapsed, many=False):
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+        if elapsed >= self._slow_query_seconds:
+            endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'none'
+            if many:
+                shape = f'{param_shape(params[0])} x{len(params)}' if params else '()'
+            else:
+                shape = param_shape(params)
+            slow_queries.inc((endpoint,))
+            slow_query_log.warning('Slow query (%.1f ms, %s): %s params=%s', elapsed * 1000, endpoint,
+                                   normalize_sql(sql), shape)
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        except Exception as e:
+            if self._on_error is not None:
+                self._on_error(e)
+            raise
+        finally:
+            self._record(sql, params, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        except Exception as e:
+            if self._on_error is not None:
+                self._on_error(e)
+            raise
+        finally:
+            self._record(sql, seq_params, time.perf_counter() - started, many=True)
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        labels = (request.endpoint or 'unmatched', request.method)
+        request_duration.observe(labels, time.perf_counter() - started)
+        request_queries.observe(labels, g.get('db_queries', 0))
+        request_db_time.observe(labels, g.get('db_time', 0.0))
+        responses.inc(labels + (response.status_code,))
+    return response
+
+
+# Query count and DB time of the current request so far
+def request_stats():
+    return {'queries': g.get('db_queries', 0), 'db_time': g.get('db_time', 0.0)}
+
+
+# Cross-process /metrics for a server with several worker processes (gunicorn). Each worker
+# writes its counters, histograms and gauge readings to its own file in `directory` every
+# `interval` seconds, and before answering a scrape; the scrape adds up every file. Files of
+# workers that have exited are kept, so totals never go backwards when a worker is replaced.
+# Other workers' numbers can be up to `interval` seconds old. The directory must start empty
+# and be private to the server (gunicorn.conf.py makes one per run).
+class SharedMetrics:
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self.pid = os.getpid()
+        # Unique per worker, so a later worker that reuses a pid does not overwrite its file
+        self.path = os.path.join(directory, f'{self.pid}-{secrets.token_hex(4)}.json')
+        self._stop = threading.Event()
+        self.flush()
+        threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logging.getLogger(__name__).exception('Could not write metrics to %s', self.path)
+
+    def flush(self):
+        data = {'pid': self.pid, 'metrics': {}, 'gauges': {}}
+        for name, metric in list(METRICS.items()):
+            if isinstance(metric, Gauge):
+                data['gauges'][name] = metric.read()
+            else:
+                data['metrics'][name] = [[list(labels), value] for labels, value in metric.values().items()]
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    # Stop writing and remove this process's file (a pre-fork master that never served requests)
+    def close(self):
+        self._stop.set()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def render(self):
+        self.flush()
+        totals = {name: {} for name in METRICS}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # Being replaced right now; its next flush is picked up by the next scrape
+            for name, series in data['metrics'].items():
+                metric = METRICS.get(name)
+                if metric is not None:
+                    metric.merge(totals[name], {tuple(labels): value for labels, value in series})
+            if _alive(data['pid']):
+                for name, value in data['gauges'].items():
+                    if name in totals:
+                        totals[name][data['pid']] = value
+        return '\n'.join(metric.render(totals[name]) for name, metric in METRICS.items()) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_shared = None
+
+
+# Prometheus text exposition of every metric, across all workers when they share a directory
+def render():
+    if _shared is not None:
+        return _shared.render()
+    return '\n'.join(metric.render() for metric in METRICS.values()) + '\n'
+
+
+# Share this process's metrics through `directory` (empty: report this process only). Called
+# again in each worker after a fork, since the flush thread does not survive it and each worker
+# needs its own file.
+def init_worker(directory, interval):
+    global _shared
+    if _shared is not None and _shared.pid == os.getpid():
+        _shared.close()
+    _shared = SharedMetrics(directory, interval) if directory else None
+
+
+# Forget every count, e.g. in a worker forked from a preloaded master, so the master's
+# warm-up counts are not repeated in every worker's totals
+def reset():
+    for metric in list(METRICS.values()):
+        if not isinstance(metric, Gauge):
+            metric.clear()
+
+
+# Stop sharing from this process, e.g. a pre-fork master after warm-up
+def close_worker():
+    global _shared
+    if _shared is not None:
+        _shared.close()
+        _shared = None
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
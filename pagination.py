@@ -0,0 +1,75 @@
+import base64
+import json
+from config import PAGE_SIZE, MAX_PAGE_SIZE
+
+
+# Clamp a requested page size to [1, MAX_PAGE_SIZE], falling back to the default
+def page_size(requested):
+    try:
+        size = int(requested)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+# Opaque, URL-safe token holding the key values of the last row on a page
+def encode_cursor(row, key_columns):
+    values = [row[column.split('.')[-1]] for column in key_columns]
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(token, key_columns):
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        return None
+    return values
+
+
+# WHERE condition and parameters selecting rows after the cursor (None, [] for the first page).
+# Rows are compared as a tuple so MySQL can range-scan an index on the same columns
+# instead of counting past an OFFSET.
+def keyset_condition(key_columns, after, descending=False):
+    last_key = decode_cursor(after, key_columns)
+    if last_key is None:
+        return None, []
+    placeholders = ', '.join(['%s'] * len(key_columns))
+    return f"({', '.join(key_columns)}) {'<' if descending else '>'} ({placeholders})", last_key
+
+
+def order_by(key_columns, descending=False):
+    return ', '.join(f"{column} {'DESC' if descending else 'ASC'}" for column in key_columns)
+
+
+# Trim the extra row fetch_page() asks for and turn it into the next page's cursor
+def split_page(rows, key_columns, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], key_columns)
+    return rows, None
+
+
+# Fetch one page ordered by key_columns, starting after the row encoded in `after`.
+# Returns (rows, next_cursor or None).
+def fetch_page(cursor, select, conditions, params, key_columns, after=None, limit=None, descending=False):
+    limit = page_size(limit)
+    conditions = list(conditions)
+    params = list(params)
+
+    condition, condition_params = keyset_condition(key_columns, after, descending)
+    if condition:
+        conditions.append(condition)
+        params.extend(condition_params)
+
+    query = select
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {order_by(key_columns, descending)} LIMIT %s'
+    params.append(limit + 1)
+
+    cursor.execute(query, tuple(params))
+    return split_page(cursor.fetchall(), key_columns, limit)
@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+import metrics
+
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+hash_duration = metrics.register(metrics.Histogram(
+    'password_hash_seconds', 'Time bcrypt spent on one operation.', ('operation',), HASH_BUCKETS))
+hash_wait = metrics.register(metrics.Histogram(
+    'password_hash_wait_seconds', 'Time an operation queued before a hashing worker picked it up.',
+    ('operation',), HASH_BUCKETS))
+hash_rejected = metrics.register(metrics.Counter(
+    'password_hash_rejected_total', 'Operations turned away because the hashing queue was full.', ('operation',)))
+
+
+# Raised when the hashing queue stays full for longer than the wait timeout
+class HasherBusy(Exception):
+    pass
+
+
+# Runs bcrypt on a fixed number of worker threads (bcrypt releases the GIL, so they hash in
+# parallel) and admits at most workers + max_queue operations at once. Request threads beyond
+# that wait up to `timeout` seconds for a slot and then get HasherBusy, so a login spike queues
+# in a bounded line instead of pinning every request thread on CPU.
+class PasswordHasher:
+    def __init__(self, rounds, workers, max_queue, timeout):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+
+    def _run(self, operation, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            hash_rejected.inc((operation,))
+            raise HasherBusy(f'Password hashing queue full after {self.timeout}s')
+        with self._lock:
+            self.queued += 1
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            hash_wait.observe((operation,), started - submitted)
+            try:
+                return func(*args)
+            finally:
+                hash_duration.observe((operation,), time.perf_counter() - started)
+                with self._lock:
+                    self.running -= 1
+
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run('hash', bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        try:
+            return self._run('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            # Not a bcrypt hash
+            return False
+
+    # A stored hash made with a different work factor than the current target ($2b$12$...)
+    def needs_rehash(self, password_hash):
+        parts = password_hash.split('$')
+        return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != self.rounds
+
+
+def hash_password(password):
+    return current_app.extensions['password_hasher'].hash(password)
+
+
+def check_password(password_hash, password):
+    return current_app.extensions['password_hasher'].verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return current_app.extensions['password_hasher'].needs_rehash(password_hash)
+
+
+# Like db.init_app, called again after a fork: worker threads do not survive it
+def init_app(app, rounds, workers, max_queue, timeout):
+    hasher = app.extensions['password_hasher'] = PasswordHasher(rounds, workers, max_queue, timeout)
+    metrics.register(metrics.Gauge('password_hash_queue_depth', 'Operations waiting for a hashing worker.',
+                                   lambda: hasher.queued))
+    metrics.register(metrics.Gauge('password_hash_in_flight', 'Operations being hashed right now.',
+                                   lambda: hasher.running))
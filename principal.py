@@ -0,0 +1,97 @@
+from flask import g, session
+from db import get_db_connection
+
+
+# The logged-in user's identity facts (role, airline, agent id, staff permissions), loaded once
+# at login and kept in the session so protected routes do not re-query them on every request.
+#
+# Staff permissions can change while a session is live, so staff principals carry the
+# permission_version they were loaded at. The first permission check in a request compares it
+# with the stored version (one primary-key lookup) and reloads the principal if
+# grant_permissions() has bumped it since.
+
+SESSION_KEY = 'principal'
+
+
+def _permission_version(cursor, username):
+    cursor.execute("SELECT version FROM permission_version WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    return row['version'] if row else 0
+
+
+def load_principal(cursor, role, email):
+    principal = {'role': role, 'email': email, 'airline_name': None,
+                 'booking_agent_id': None, 'permissions': [], 'version': 0}
+
+    if role == 'airline_staff':
+        cursor.execute("SELECT airline_name FROM airline_staff WHERE username = %s", (email,))
+        staff = cursor.fetchone()
+        if staff:
+            principal['airline_name'] = staff['airline_name']
+        principal['version'] = _permission_version(cursor, email)
+        cursor.execute("SELECT permission_type FROM permission WHERE username = %s", (email,))
+        principal['permissions'] = [row['permission_type'] for row in cursor.fetchall()]
+
+    elif role == 'booking_agent':
+        cursor.execute("SELECT booking_agent_id FROM booking_agent WHERE email = %s", (email,))
+        agent = cursor.fetchone()
+        if agent:
+            principal['booking_agent_id'] = agent['booking_agent_id']
+        cursor.execute("SELECT airline_name FROM booking_agent_work_for WHERE email = %s", (email,))
+        work_for = cursor.fetchone()
+        if work_for:
+            principal['airline_name'] = work_for['airline_name']
+
+    return principal
+
+
+def _reload(email, role):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        principal = load_principal(cursor, role, email)
+    finally:
+        cursor.close()
+        conn.close()
+    session[SESSION_KEY] = principal
+    return principal
+
+
+# The session's principal, loaded on demand for sessions that predate it
+def current_principal():
+    if 'user_email' not in session:
+        return None
+    principal = session.get(SESSION_KEY)
+    if principal is None or principal['email'] != session['user_email']:
+        principal = _reload(session['user_email'], session['role'])
+        g.principal_verified = True
+    return principal
+
+
+# Whether the logged-in staff member holds `permission_type` ('Admin', 'Operator')
+def has_permission(permission_type):
+    principal = current_principal()
+    if principal is None or principal['role'] != 'airline_staff':
+        return False
+
+    if not g.get('principal_verified'):
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            version = _permission_version(cursor, principal['email'])
+        finally:
+            cursor.close()
+            conn.close()
+        if version != principal['version']:
+            principal = _reload(principal['email'], principal['role'])
+        g.principal_verified = True
+
+    return permission_type in principal['permissions']
+
+
+# Invalidate every cached principal of `username`; call inside the transaction that changes its permissions
+def bump_permission_version(cursor, username):
+    cursor.execute("""
+        INSERT INTO permission_version (username, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (username,))
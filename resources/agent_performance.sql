@@ -0,0 +1,18 @@
+-- Daily booking agent sales summary read by the staff booking agent leaderboards (sales.py).
+-- Populate it for existing purchases with: flask --app "app:create_app()" rebuild-sales-rollup
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `agent_performance`
+--
+
+CREATE TABLE `agent_performance` (
+  `airline_name` varchar(50) NOT NULL,
+  `sales_day` date NOT NULL,
+  `booking_agent_id` int(11) NOT NULL,
+  `tickets` int(11) NOT NULL DEFAULT 0,
+  `commission` decimal(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY(`airline_name`, `sales_day`, `booking_agent_id`),
+  FOREIGN KEY(`airline_name`) REFERENCES `airline`(`airline_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -0,0 +1,15 @@
+-- Per-entity data versions keying the cached dashboard fragments (fragments.py), e.g.
+-- `customer:<email>`, `airline:<name>` and `schedule`. Write routes bump the entities they
+-- change in the same transaction as the change; a missing row reads as version 0.
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `data_version`
+--
+
+CREATE TABLE `data_version` (
+  `entity` varchar(100) NOT NULL,
+  `version` bigint(20) NOT NULL DEFAULT 0,
+  PRIMARY KEY(`entity`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -0,0 +1,20 @@
+-- Monthly flight and ticket counters per destination read by the top destinations page (destinations.py).
+-- Populate it for existing flights with: flask --app "app:create_app()" rebuild-sales-rollup
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `destination_counts`
+--
+
+CREATE TABLE `destination_counts` (
+  `airline_name` varchar(50) NOT NULL,
+  `arrival_airport` varchar(50) NOT NULL,
+  `flight_month` date NOT NULL,
+  `slot` tinyint(4) NOT NULL,
+  `flights` int(11) NOT NULL DEFAULT 0,
+  `tickets_sold` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY(`airline_name`, `flight_month`, `arrival_airport`, `slot`),
+  FOREIGN KEY(`airline_name`) REFERENCES `airline`(`airline_name`),
+  FOREIGN KEY(`arrival_airport`) REFERENCES `airport`(`airport_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
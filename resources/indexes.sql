@@ -0,0 +1,26 @@
+-- Secondary indexes used by the application's hot queries.
+-- Run once after Solution_ProjectPart2_create_tables.sql.
+
+-- --------------------------------------------------------
+
+--
+-- Keyset pagination of flight listings (home page, /api/flights)
+--
+
+CREATE INDEX `idx_flight_departure` ON `flight` (`departure_time`, `airline_name`, `flight_num`);
+
+-- --------------------------------------------------------
+
+--
+-- Flight search by route and departure day (flight_search.search_flights)
+--
+
+CREATE INDEX `idx_flight_route` ON `flight` (`departure_airport`, `arrival_airport`, `departure_time`, `airline_name`);
+
+-- --------------------------------------------------------
+
+--
+-- Partial-month edges of staff sales reports (sales.sales_between)
+--
+
+CREATE INDEX `idx_purchases_date` ON `purchases` (`purchase_date`);
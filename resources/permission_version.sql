@@ -0,0 +1,15 @@
+-- Per-staff permission version used to invalidate cached session principals (principal.py).
+-- grant_permissions() bumps a staff member's row whenever their permissions change.
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `permission_version`
+--
+
+CREATE TABLE `permission_version` (
+  `username` varchar(50) NOT NULL,
+  `version` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY(`username`),
+  FOREIGN KEY(`username`) REFERENCES `airline_staff`(`username`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
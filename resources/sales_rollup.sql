@@ -0,0 +1,21 @@
+-- Daily sales rollup read by the staff report pages (sales.py).
+-- Populate it for existing purchases with: flask --app "app:create_app()" rebuild-sales-rollup
+-- Upgrading from the monthly table (a sales_month column): DROP TABLE sales_rollup, create this
+-- one, then run the rebuild command above.
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `sales_rollup`
+--
+
+CREATE TABLE `sales_rollup` (
+  `airline_name` varchar(50) NOT NULL,
+  `sales_day` date NOT NULL,
+  `channel` varchar(10) NOT NULL,
+  `slot` tinyint(4) NOT NULL,
+  `tickets` int(11) NOT NULL DEFAULT 0,
+  `revenue` decimal(14,0) NOT NULL DEFAULT 0,
+  PRIMARY KEY(`airline_name`, `sales_day`, `channel`, `slot`),
+  FOREIGN KEY(`airline_name`) REFERENCES `airline`(`airline_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
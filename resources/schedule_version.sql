@@ -0,0 +1,17 @@
+-- Single-row schedule version used for HTTP caching of the public flight pages (schedule.py).
+-- create_flight() and change_flight_status() bump it in the same transaction as their change.
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `schedule_version`
+--
+
+CREATE TABLE `schedule_version` (
+  `id` tinyint(4) NOT NULL,
+  `version` int(11) NOT NULL DEFAULT 0,
+  `updated_at` datetime NOT NULL,
+  PRIMARY KEY(`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+INSERT INTO `schedule_version` (`id`, `version`, `updated_at`) VALUES (1, 0, UTC_TIMESTAMP());
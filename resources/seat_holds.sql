@@ -0,0 +1,25 @@
+-- Seats held during checkout (holds.py). A hold takes its tickets off the available_ticket
+-- free-list, so other buyers cannot get them, and either becomes purchases rows on
+-- confirmation or goes back on the free-list when it expires. idx_seat_hold_expires lets
+-- the sweeper find expired holds without scanning live ones.
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `seat_hold`
+--
+
+CREATE TABLE `seat_hold` (
+  `ticket_id` int(11) NOT NULL,
+  `hold_id` char(32) NOT NULL,
+  `airline_name` varchar(50) NOT NULL,
+  `flight_num` int(11) NOT NULL,
+  `customer_email` varchar(50) NOT NULL,
+  `booking_agent_id` int(11) DEFAULT NULL,
+  `expires_at` datetime NOT NULL,
+  PRIMARY KEY(`ticket_id`),
+  KEY `idx_seat_hold_id` (`hold_id`),
+  KEY `idx_seat_hold_expires` (`expires_at`),
+  FOREIGN KEY(`ticket_id`) REFERENCES `ticket`(`ticket_id`),
+  FOREIGN KEY(`customer_email`) REFERENCES `customer`(`email`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -0,0 +1,29 @@
+-- Free-list of unsold tickets used by seats.allocate_seat().
+-- Requires MySQL 8.0+ (SELECT ... FOR UPDATE SKIP LOCKED).
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `available_ticket`
+--
+
+CREATE TABLE `available_ticket` (
+  `airline_name` varchar(50) NOT NULL,
+  `flight_num` int(11) NOT NULL,
+  `ticket_id` int(11) NOT NULL,
+  PRIMARY KEY(`airline_name`, `flight_num`, `ticket_id`),
+  UNIQUE KEY(`ticket_id`),
+  FOREIGN KEY(`ticket_id`) REFERENCES `ticket`(`ticket_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- --------------------------------------------------------
+
+--
+-- Backfill from existing tickets that have not been purchased
+--
+
+INSERT INTO `available_ticket` (`airline_name`, `flight_num`, `ticket_id`)
+SELECT t.`airline_name`, t.`flight_num`, t.`ticket_id`
+FROM `ticket` t
+LEFT JOIN `purchases` p ON t.`ticket_id` = p.`ticket_id`
+WHERE p.`ticket_id` IS NULL;
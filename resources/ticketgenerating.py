@@ -5,16 +5,26 @@ number_of_tickets = 200
 start_ticket_id = 800  # Ensure this is set to avoid duplicates
 output_file = 'tickets_china_eastern_104.sql'
 
-# Generate SQL Insert Statements
-with open(output_file, 'w') as file:
-    file.write("INSERT INTO `ticket` (`ticket_id`, `airline_name`, `flight_num`) VALUES\n")
+
+# (ticket_id, airline_name, flight_num) rows for one flight; also used by benchmarks/generate_data.py
+def ticket_rows(airline_name, flight_num, number_of_tickets, start_ticket_id):
     for i in range(number_of_tickets):
-        ticket_id = start_ticket_id + i
-        line = f"({ticket_id}, '{airline_name}', {flight_num})"
-        if i < number_of_tickets - 1:
-            line += ",\n"
-        else:
-            line += ";\n"
-        file.write(line)
+        yield (start_ticket_id + i, airline_name, flight_num)
+
+
+# Generate SQL Insert Statements
+def write_ticket_inserts(output_file, airline_name, flight_num, number_of_tickets, start_ticket_id):
+    with open(output_file, 'w') as file:
+        file.write("INSERT INTO `ticket` (`ticket_id`, `airline_name`, `flight_num`) VALUES\n")
+        for i, (ticket_id, airline, flight) in enumerate(ticket_rows(airline_name, flight_num, number_of_tickets, start_ticket_id)):
+            line = f"({ticket_id}, '{airline}', {flight})"
+            if i < number_of_tickets - 1:
+                line += ",\n"
+            else:
+                line += ";\n"
+            file.write(line)
+
 
-print(f"SQL insert statements for {number_of_tickets} tickets have been written to '{output_file}'.")
+if __name__ == '__main__':
+    write_ticket_inserts(output_file, airline_name, flight_num, number_of_tickets, start_ticket_id)
+    print(f"SQL insert statements for {number_of_tickets} tickets have been written to '{output_file}'.")
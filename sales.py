@@ -0,0 +1,135 @@
+import heapq
+import random
+from datetime import date, timedelta
+
+
+# Per-(airline, day, channel) ticket and revenue totals kept in the sales_rollup table
+# (resources/sales_rollup.sql). Both purchase paths add to it in the same transaction as the
+# purchases row, so staff reports range-scan at most a few thousand rollup rows a year instead
+# of joining every ticket sold. Daily buckets answer any date range, not only whole months.
+#
+# Each (airline, month, channel) total is spread over ROLLUP_SLOTS rows picked at random, so
+# concurrent purchases for the same airline do not all queue on one row lock. Readers sum
+# over the slots.
+
+ROLLUP_SLOTS = 8
+
+
+# Add `tickets` tickets of a flight, sold today, to the rollup. Call before committing the purchase.
+def record_sale(cursor, airline_name, flight_num, via_agent, tickets=1):
+    cursor.execute("""
+        INSERT INTO sales_rollup (airline_name, sales_day, channel, slot, tickets, revenue)
+        SELECT airline_name, CURDATE(), %s, %s, %s, price * %s
+        FROM flight
+        WHERE airline_name = %s AND flight_num = %s
+        ON DUPLICATE KEY UPDATE tickets = tickets + VALUES(tickets), revenue = revenue + VALUES(revenue)
+    """, ('agent' if via_agent else 'direct', random.randrange(ROLLUP_SLOTS), tickets, tickets,
+          airline_name, flight_num))
+
+
+# Recompute the whole rollup from purchases (backfills, or after fixing data by hand)
+def rebuild(cursor):
+    cursor.execute("DELETE FROM sales_rollup")
+    cursor.execute("""
+        INSERT INTO sales_rollup (airline_name, sales_day, channel, slot, tickets, revenue)
+        SELECT t.airline_name, p.purchase_date,
+               IF(p.booking_agent_id IS NULL, 'direct', 'agent') AS channel, 0,
+               COUNT(p.ticket_id), SUM(f.price)
+        FROM purchases p
+        JOIN ticket t ON p.ticket_id = t.ticket_id
+        JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = f.airline_name
+        GROUP BY t.airline_name, p.purchase_date, channel
+    """)
+    return cursor.rowcount
+
+
+# Booking agents earn this share of each ticket's price
+COMMISSION_RATE = 0.05
+
+
+# Per-(airline, day, agent) tickets and commission in agent_performance, the summary rows behind
+# the booking agent leaderboards. Call from the agent purchase path before committing.
+def record_agent_sale(cursor, airline_name, flight_num, booking_agent_id, tickets=1):
+    cursor.execute("""
+        INSERT INTO agent_performance (airline_name, sales_day, booking_agent_id, tickets, commission)
+        SELECT airline_name, CURDATE(), %s, %s, price * %s * %s
+        FROM flight
+        WHERE airline_name = %s AND flight_num = %s
+        ON DUPLICATE KEY UPDATE tickets = tickets + VALUES(tickets), commission = commission + VALUES(commission)
+    """, (booking_agent_id, tickets, COMMISSION_RATE, tickets, airline_name, flight_num))
+
+
+def rebuild_agent_performance(cursor):
+    cursor.execute("DELETE FROM agent_performance")
+    cursor.execute("""
+        INSERT INTO agent_performance (airline_name, sales_day, booking_agent_id, tickets, commission)
+        SELECT t.airline_name, p.purchase_date, p.booking_agent_id,
+               COUNT(p.ticket_id), SUM(f.price * %s)
+        FROM purchases p
+        JOIN ticket t ON p.ticket_id = t.ticket_id
+        JOIN flight f ON t.flight_num = f.flight_num AND t.airline_name = f.airline_name
+        WHERE p.booking_agent_id IS NOT NULL
+        GROUP BY t.airline_name, p.purchase_date, p.booking_agent_id
+    """, (COMMISSION_RATE,))
+    return cursor.rowcount
+
+
+# Top `k` booking agents of an airline by tickets sold since month_start, tickets sold since
+# year_start, and commission earned since year_start. One pass over the airline's daily summary
+# rows for the year, then a bounded top-k selection per leaderboard.
+def agent_leaderboards(cursor, airline_name, month_start, year_start, k=5):
+    cursor.execute("""
+        SELECT ba.email,
+               COALESCE(SUM(CASE WHEN ap.sales_day >= %s THEN ap.tickets END), 0) AS tickets_month,
+               COALESCE(SUM(ap.tickets), 0) AS tickets_year,
+               COALESCE(SUM(ap.commission), 0) AS commission_year
+        FROM booking_agent_work_for w
+        JOIN booking_agent ba ON ba.email = w.email
+        LEFT JOIN agent_performance ap ON ap.airline_name = w.airline_name
+                                      AND ap.booking_agent_id = ba.booking_agent_id
+                                      AND ap.sales_day >= %s
+        WHERE w.airline_name = %s
+        GROUP BY ba.email
+    """, (month_start, year_start, airline_name))
+    agents = cursor.fetchall()
+
+    by_month = heapq.nlargest(k, agents, key=lambda agent: agent['tickets_month'])
+    by_year = heapq.nlargest(k, agents, key=lambda agent: agent['tickets_year'])
+    by_commission = heapq.nlargest(k, agents, key=lambda agent: agent['commission_year'])
+    return (
+        [{'email': agent['email'], 'tickets_sold': int(agent['tickets_month'])} for agent in by_month],
+        [{'email': agent['email'], 'tickets_sold': int(agent['tickets_year'])} for agent in by_year],
+        [{'email': agent['email'], 'commission_received': agent['commission_year']} for agent in by_commission],
+    )
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+# `day` moved back by `months` calendar months, clamped like MySQL's day - INTERVAL n MONTH
+def months_before(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    first = date(year, month + 1, 1)
+    last_day = (_next_month(first) - timedelta(days=1)).day
+    return first.replace(day=min(day.day, last_day))
+
+
+# Sales of an airline with purchase_date in [start, end] (dates, both inclusive), as
+# {'YYYY-MM': {'direct': {'tickets', 'revenue'}, 'agent': {...}}}, from one range scan of the
+# airline's daily rollup rows, so ranges that start or end mid-month never touch purchases
+def sales_between(cursor, airline_name, start, end):
+    cursor.execute("""
+        SELECT DATE_FORMAT(sales_day, '%Y-%m') AS month, channel, SUM(tickets) AS tickets, SUM(revenue) AS revenue
+        FROM sales_rollup
+        WHERE airline_name = %s AND sales_day BETWEEN %s AND %s
+        GROUP BY month, channel
+    """, (airline_name, start, end))
+
+    totals = {}
+    for row in cursor.fetchall():
+        bucket = totals.setdefault(row['month'], {'direct': {'tickets': 0, 'revenue': 0},
+                                                  'agent': {'tickets': 0, 'revenue': 0}})
+        bucket[row['channel']]['tickets'] += int(row['tickets'] or 0)
+        bucket[row['channel']]['revenue'] += row['revenue'] or 0
+    return dict(sorted(totals.items()))
@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from datetime import timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from db import get_db_connection
+
+
+# Process-wide copy of the schedule version (resources/schedule_version.sql). Public flight
+# pages derive their ETag and Last-Modified from it, so a conditional GET can be answered
+# with a 304 from memory. The copy is re-read at most every `ttl` seconds, which bounds how
+# long another worker's bump goes unnoticed; this process's own bumps call invalidate().
+class ScheduleVersion:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def _fresh(self):
+        return self._data is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    # Returns (version, updated_at), updated_at being a naive UTC datetime
+    def get(self):
+        if self._fresh():
+            return self._data
+
+        with self._lock:
+            if self._fresh():
+                return self._data
+            generation = self._generation
+
+        data = self._load()
+
+        with self._lock:
+            if generation == self._generation:
+                self._data = data
+                self._loaded_at = time.monotonic()
+        return data
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._data = None
+
+    def _load(self):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version, updated_at FROM schedule_version WHERE id = 1")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        return row
+
+
+# Mark the schedule as changed inside the caller's transaction and return the new version.
+# LAST_INSERT_ID(expr) hands the incremented value back without a second query.
+def bump(cursor):
+    cursor.execute("""
+        UPDATE schedule_version SET version = LAST_INSERT_ID(version + 1), updated_at = UTC_TIMESTAMP()
+        WHERE id = 1
+    """)
+    return cursor.lastrowid
+
+
+# Logged-in users see their own navbar and, for booking agents, only their airline's flights,
+# so their ETags are scoped to the user and their responses are private
+def _viewer():
+    user_email = session.get('user_email')
+    if user_email is None:
+        return None
+    return hashlib.sha1(f"{session.get('role')}:{user_email}".encode()).hexdigest()[:12]
+
+
+# Decorator for public schedule pages: answers conditional GETs with 304 without running the
+# view, and tags fresh 200 responses with ETag, Last-Modified and Cache-Control headers
+# (guests may be cached for SCHEDULE_MAX_AGE seconds)
+def conditional_on(schedule_version):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # A pending flash message has to be rendered, so skip the cache for this response
+            if session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            version, updated_at = schedule_version.get()
+            viewer = _viewer()
+            etag = f'schedule-{version}' if viewer is None else f'schedule-{version}-{viewer}'
+            last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif viewer is None and request.if_modified_since:
+                not_modified = last_modified <= request.if_modified_since
+
+            response = make_response('', 304) if not_modified else make_response(f(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+
+            response.set_etag(etag)
+            response.vary.add('Cookie')
+            if viewer is None:
+                response.last_modified = last_modified
+                response.cache_control.public = True
+                response.cache_control.max_age = current_app.config['SCHEDULE_MAX_AGE']
+            else:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,72 @@
+# Seat inventory backed by the available_ticket free-list (resources/seat_inventory.sql).
+# Every unsold ticket has one row there; a purchase takes a row out in the same transaction
+# that inserts into purchases, so finding a free seat is a primary-key lookup no matter how
+# many seats on the flight are already sold.
+
+
+# Claim `count` free tickets on the flight in one locked batch and return their ticket_ids, or
+# None if fewer than `count` are free. SKIP LOCKED lets concurrent buyers on the same flight each
+# take different rows instead of queueing behind (or colliding on) the first. All or nothing: on
+# None the caller rolls back, which releases the rows it did lock, so a party is never split
+# across a competing buyer. The caller must commit or roll back.
+def allocate_seats(cursor, airline_name, flight_num, count):
+    cursor.execute("""
+        SELECT ticket_id FROM available_ticket
+        WHERE airline_name = %s AND flight_num = %s
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (airline_name, flight_num, count))
+    ticket_ids = [row['ticket_id'] for row in cursor.fetchall()]
+    if len(ticket_ids) < count:
+        return None
+
+    placeholders = ', '.join(['%s'] * len(ticket_ids))
+    cursor.execute(f"""
+        DELETE FROM available_ticket
+        WHERE airline_name = %s AND flight_num = %s AND ticket_id IN ({placeholders})
+    """, (airline_name, flight_num, *ticket_ids))
+    return ticket_ids
+
+
+# Seats requested by a booking form's `quantity` field (1 if absent). Raises ValueError unless
+# it is a whole number from 1 to max_party_size.
+def party_size(value, max_party_size):
+    count = int(value) if value not in (None, '') else 1
+    if not 1 <= count <= max_party_size:
+        raise ValueError(f'Party size must be between 1 and {max_party_size}')
+    return count
+
+
+# Record the purchase of every ticket in ticket_ids with one multi-row INSERT
+def insert_purchases(cursor, ticket_ids, customer_email, booking_agent_id=None):
+    values = ', '.join(['(%s, %s, %s, CURDATE())'] * len(ticket_ids))
+    params = []
+    for ticket_id in ticket_ids:
+        params.extend((ticket_id, customer_email, booking_agent_id))
+    cursor.execute(f"""
+        INSERT INTO purchases (ticket_id, customer_email, booking_agent_id, purchase_date)
+        VALUES {values}
+    """, tuple(params))
+
+
+# Rows per multi-row INSERT when materialising a flight's tickets
+INSERT_CHUNK_SIZE = 500
+
+
+# Create number_of_seats tickets for a new flight and put them all on the free-list, as a few
+# multi-row INSERTs inside the caller's transaction. ticket_id has no AUTO_INCREMENT, so the
+# ids are assigned here as a block after the current maximum; locking the highest row makes
+# concurrent flight creations take turns instead of colliding on the same ids.
+def create_flight_inventory(cursor, airline_name, flight_num, number_of_seats):
+    cursor.execute("SELECT ticket_id FROM ticket ORDER BY ticket_id DESC LIMIT 1 FOR UPDATE")
+    last_ticket = cursor.fetchone()
+    first_id = (last_ticket['ticket_id'] if last_ticket else 0) + 1
+
+    rows = [(first_id + i, airline_name, flight_num) for i in range(number_of_seats)]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        cursor.executemany(
+            "INSERT INTO ticket (ticket_id, airline_name, flight_num) VALUES (%s, %s, %s)", chunk)
+        cursor.executemany(
+            "INSERT INTO available_ticket (ticket_id, airline_name, flight_num) VALUES (%s, %s, %s)", chunk)
+    return len(rows)
@@ -0,0 +1,283 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from db import get_db_connection
+from flight_search import SEARCH_COLUMNS, day_range
+
+# File layout: header, JSON string table, then one fixed-width column per field, each padded
+# to 8 bytes. Rows are sorted by (departure_airport, arrival_airport, departure_time, airline_name,
+# flight_num), so a route's flights on a day are one contiguous run found by bisect.
+MAGIC = b'FLTSNAP2'
+# magic, database digest, schedule version and updated_at (epoch seconds), row count, string table length
+HEADER = struct.Struct('=8s16sQqQQ')
+COLUMNS = (
+    ('departure_time', 'q'),  # Seconds since the epoch, naive UTC like the DATETIME column
+    ('arrival_time', 'q'),
+    ('price', 'q'),
+    ('flight_num', 'i'),
+    ('airplane_id', 'i'),
+    ('by_flight_num', 'i'),   # Row numbers ordered by (flight_num, airline_name), for flight_details()
+    ('airline_name', 'H'),    # Index into the interned string table
+    ('departure_airport', 'H'),
+    ('arrival_airport', 'H'),
+    ('status', 'B'),          # Index into the status table
+)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _padded(size):
+    return (size + 7) // 8 * 8
+
+
+def _epoch(value):
+    return int((value - EPOCH).total_seconds())
+
+
+# Identifies the database a snapshot was exported from, so an instance pointed at another
+# database (or host) never maps it
+def database_digest(host, database):
+    return hashlib.blake2b(f'{host}/{database}'.encode(), digest_size=16).digest()
+
+
+# Write every flight, with the schedule version and updated_at it was read at (its stamp), to
+# `path`. Both come from one transaction, so the stamp describes exactly these rows. The file is
+# written to a new, uniquely named file beside `path` (mkstemp, so a planted symlink is never
+# followed) and renamed over it, so readers see either the old snapshot or the new one, never
+# half of one.
+def export(cursor, path, digest):
+    cursor.execute("SELECT version, updated_at FROM schedule_version WHERE id = 1")
+    version, updated_at = cursor.fetchone()
+    cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM flight")
+    rows = cursor.fetchall()
+
+    strings = sorted({row[0] for row in rows} | {row[2] for row in rows} | {row[4] for row in rows})
+    statuses = sorted({row[7] for row in rows})
+    string_ids = {value: index for index, value in enumerate(strings)}
+    status_ids = {value: index for index, value in enumerate(statuses)}
+    rows.sort(key=lambda row: (row[2], row[4], row[3], row[0], row[1]))
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    for airline_name, flight_num, departure_airport, departure_time, arrival_airport, arrival_time, \
+            price, status, airplane_id in rows:
+        columns['departure_time'].append(_epoch(departure_time))
+        columns['arrival_time'].append(_epoch(arrival_time))
+        columns['price'].append(int(price))
+        columns['flight_num'].append(flight_num)
+        columns['airplane_id'].append(airplane_id)
+        columns['airline_name'].append(string_ids[airline_name])
+        columns['departure_airport'].append(string_ids[departure_airport])
+        columns['arrival_airport'].append(string_ids[arrival_airport])
+        columns['status'].append(status_ids[status])
+    columns['by_flight_num'].extend(sorted(range(len(rows)), key=lambda i: (rows[i][1], rows[i][0])))
+
+    table = json.dumps({'strings': strings, 'statuses': statuses}).encode()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, digest, version, _epoch(updated_at), len(rows), len(table)))
+            f.write(table.ljust(_padded(len(table)), b'\0'))
+            for name, _ in COLUMNS:
+                data = columns[name].tobytes()
+                f.write(data.ljust(_padded(len(data)), b'\0'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return version, len(rows)
+
+
+# (schedule version, updated_at) a snapshot file was written at, or None if there is no
+# readable one exported from the database `digest` identifies
+def _file_stamp(path, digest):
+    try:
+        with open(path, 'rb') as f:
+            magic, file_digest, version, updated_at, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return (version, updated_at) if magic == MAGIC and file_digest == digest else None
+
+
+# One snapshot file mapped read-only. Every worker on the host maps the same file, so the
+# kernel keeps a single copy of it in the page cache; the columns are typed memoryviews over
+# the mapping and nothing is copied into Python objects until a field is read.
+class Snapshot:
+    def __init__(self, path, digest):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, file_digest, version, updated_at, self.count, table_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC or file_digest != digest:
+            raise ValueError(f'{path} is not a flight snapshot of this database')
+        self.stamp = (version, updated_at)
+        table = json.loads(self._map[HEADER.size:HEADER.size + table_size])
+        self.strings = table['strings']
+        self.statuses = table['statuses']
+        self.string_ids = {value: index for index, value in enumerate(self.strings)}
+
+        view = memoryview(self._map)
+        offset = HEADER.size + _padded(table_size)
+        for name, typecode in COLUMNS:
+            size = self.count * struct.calcsize(typecode)
+            setattr(self, name, view[offset:offset + size].cast(typecode))
+            offset += _padded(size)
+
+    def _route_key(self, i):
+        return self.departure_airport[i], self.arrival_airport[i], self.departure_time[i]
+
+    # Direct flights like flight_search.search_flights(), as Flight views. Raises ValueError on a bad date.
+    def search(self, source, destination, date, airline_name=None):
+        start, end = day_range(date)
+        source_id, destination_id = self.string_ids.get(source), self.string_ids.get(destination)
+        airline_id = self.string_ids.get(airline_name) if airline_name is not None else None
+        if source_id is None or destination_id is None or (airline_name is not None and airline_id is None):
+            return []
+        rows = range(self.count)
+        lo = bisect_left(rows, (source_id, destination_id, _epoch(start)), key=self._route_key)
+        hi = bisect_left(rows, (source_id, destination_id, _epoch(end)), lo=lo, key=self._route_key)
+        return [Flight(self, i) for i in range(lo, hi) if airline_id is None or self.airline_name[i] == airline_id]
+
+    # First flight with this number (lowest airline name, as the primary key orders it), or None
+    def find(self, flight_num):
+        order = self.by_flight_num
+        index = bisect_left(range(self.count), flight_num, key=lambda j: self.flight_num[order[j]])
+        if index < self.count and self.flight_num[order[index]] == flight_num:
+            return Flight(self, order[index])
+        return None
+
+
+# Read-only row of a Snapshot. Supports flight['column'] (so Jinja's flight.column too) and
+# dict(flight); each field is decoded from the mapping when read.
+class Flight:
+    __slots__ = ('_snapshot', '_row')
+
+    FIELDS = {
+        'airline_name': lambda s, i: s.strings[s.airline_name[i]],
+        'flight_num': lambda s, i: s.flight_num[i],
+        'departure_airport': lambda s, i: s.strings[s.departure_airport[i]],
+        'departure_time': lambda s, i: EPOCH + timedelta(seconds=s.departure_time[i]),
+        'arrival_airport': lambda s, i: s.strings[s.arrival_airport[i]],
+        'arrival_time': lambda s, i: EPOCH + timedelta(seconds=s.arrival_time[i]),
+        'price': lambda s, i: Decimal(s.price[i]),
+        'status': lambda s, i: s.statuses[s.status[i]],
+        'airplane_id': lambda s, i: s.airplane_id[i],
+    }
+
+    def __init__(self, snapshot, row):
+        self._snapshot = snapshot
+        self._row = row
+
+    def __getitem__(self, name):
+        return self.FIELDS[name](self._snapshot, self._row)
+
+    def get(self, name, default=None):
+        return self[name] if name in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS.keys()
+
+
+# The snapshot this process answers from. current() returns it only while its stamp equals the
+# live schedule version and updated_at, and None otherwise, so callers fall back to MySQL instead
+# of serving a stale schedule; comparing updated_at too catches a schedule_version row that was
+# reset and counted up again. A stale file is re-exported in the background by one worker on the
+# host (the others skip while it holds the lock file) and each worker maps the new file on its
+# next check. The file name and header carry the database identity, so instances on one host
+# that use different databases never share a file. `directory` is created readable by the app
+# user only; it is disabled when empty.
+class FlightSnapshots:
+    def __init__(self, schedule_version):
+        self.schedule_version = schedule_version
+        self.path = None
+        self.digest = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._exporting = False
+
+    def configure(self, directory, host, database):
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', f'{host}_{database}')
+        self.path = os.path.join(directory, f'airline_flights_{name}.snap') if directory else None
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.digest = database_digest(host, database)
+        with self._lock:
+            self._snapshot = None
+
+    def _stamp(self):
+        version, updated_at = self.schedule_version.get()
+        return version, _epoch(updated_at)
+
+    def current(self):
+        if not self.path:
+            return None
+        stamp = self._stamp()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+        snapshot = self._open(stamp)
+        if snapshot is None:
+            self._export_in_background()
+        return snapshot
+
+    # Map the file if it has `stamp`; otherwise keep the current one and return None
+    def _open(self, stamp):
+        if _file_stamp(self.path, self.digest) != stamp:
+            return None
+        with self._lock:
+            if self._snapshot is None or self._snapshot.stamp != stamp:
+                snapshot = Snapshot(self.path, self.digest)
+                if snapshot.stamp != stamp:
+                    return None  # Replaced between the two reads; the next check picks it up
+                self._snapshot = snapshot
+            return self._snapshot
+
+    def _export_in_background(self):
+        with self._lock:
+            if self._exporting:
+                return
+            self._exporting = True
+        threading.Thread(target=self.refresh, args=(current_app._get_current_object(),),
+                         name='flight-snapshot', daemon=True).start()
+
+    # Export a new snapshot unless the file is already up to date, then map it
+    def refresh(self, app):
+        try:
+            # O_NOFOLLOW: refuse a symlink planted in place of the lock file
+            lock_fd = os.open(f'{self.path}.lock', os.O_CREAT | os.O_RDWR | os.O_NOFOLLOW, 0o600)
+            try:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # Another worker is exporting
+                with app.app_context():
+                    # Compare against the database, not this process's cached copy, which may lag
+                    self.schedule_version.invalidate()
+                    stamp = self._stamp()
+                    if _file_stamp(self.path, self.digest) != stamp:
+                        conn = get_db_connection()
+                        cursor = conn.cursor()
+                        try:
+                            version, rows = export(cursor, self.path, self.digest)
+                        finally:
+                            cursor.close()
+                            conn.close()
+                        app.logger.info('Exported flight snapshot version %s (%d flights)', version, rows)
+                    self._open(stamp)
+            finally:
+                os.close(lock_fd)
+        except Exception:
+            app.logger.exception('Flight snapshot export failed, searches use MySQL meanwhile')
+        finally:
+            with self._lock:
+                self._exporting = False
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+from decimal import Decimal
+import dashboards
+from pagination import encode_cursor
+
+# Round-trips customer_dashboard() made before dashboards.load_customer_dashboard(): the customer
+# row twice, both airport scans, the 6-month and 1-year spending, the custom range, and the
+# upcoming and history joins
+OLD_QUERY_COUNT = 9
+
+
+# Cursor that records every statement and answers it with the next canned result
+class RecordingCursor:
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+        self._result = None
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+        self._result = self.results.pop(0)
+
+    def fetchone(self):
+        return self._result
+
+    def fetchall(self):
+        return list(self._result)
+
+
+def _booking(section, departure_time, ticket_id):
+    return {'section': section, 'airline_name': 'Airline 1', 'flight_num': ticket_id,
+            'departure_time': departure_time, 'arrival_time': departure_time, 'departure_airport': 'AAA',
+            'arrival_airport': 'AAB', 'status': 'upcoming' if section == 'upcoming' else 'completed',
+            'purchase_date': date(2026, 1, 1), 'price': Decimal(100), 'ticket_id': ticket_id}
+
+
+def _results():
+    customer = {'email': 'customer1@example.com', 'name': 'Customer 1'}
+    spending = [
+        {'month': '2025-06', 'last_six_months': None, 'last_year': Decimal(50), 'in_range': Decimal(50)},
+        {'month': '2026-01', 'last_six_months': Decimal(100), 'last_year': Decimal(100), 'in_range': None},
+    ]
+    bookings = [
+        _booking('history', datetime(2025, 3, 1), 2),
+        _booking('upcoming', datetime(2026, 12, 1), 3),
+        _booking('history', datetime(2025, 9, 1), 1),
+    ]
+    return [customer, spending, bookings]
+
+
+def test_customer_dashboard_round_trips():
+    cursor = RecordingCursor(_results())
+    dashboard = dashboards.load_customer_dashboard(cursor, 'customer1@example.com',
+                                                   start_date='2025-01-01', end_date='2025-12-31')
+
+    assert len(cursor.statements) == 3
+    assert len(cursor.statements) < OLD_QUERY_COUNT
+    assert [row['ticket_id'] for row in dashboard['upcoming_flights']] == [3]
+    assert [row['ticket_id'] for row in dashboard['booking_history']] == [1, 2]
+    assert dashboard['total_spent_last_six_months'] == 100
+    assert dashboard['total_spent_last_year'] == 150
+    assert dashboard['total_spent_range'] == 50
+    assert dashboard['history_next'] is None
+
+
+def test_customer_dashboard_history_page_round_trips():
+    after = encode_cursor({'departure_time': datetime(2025, 10, 1), 'airline_name': 'Airline 1',
+                           'flight_num': 9, 'ticket_id': 9}, dashboards.HISTORY_KEY)
+    cursor = RecordingCursor(_results())
+    dashboards.load_customer_dashboard(cursor, 'customer1@example.com', history_after=after)
+
+    assert len(cursor.statements) == 3
+    assert len(cursor.statements) < OLD_QUERY_COUNT
+    query, params = cursor.statements[-1]
+    assert 'UNION ALL' in query
+    assert len(params) == 2 + len(dashboards.HISTORY_KEY) + 1
@@ -0,0 +1,38 @@
+from datetime import date
+from decimal import Decimal
+import sales
+
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+def test_sales_between_mid_month_range_reads_only_the_rollup():
+    cursor = RecordingCursor([
+        {'month': '2025-03', 'channel': 'direct', 'tickets': 4, 'revenue': Decimal(400)},
+        {'month': '2025-03', 'channel': 'agent', 'tickets': 1, 'revenue': Decimal(90)},
+        {'month': '2025-04', 'channel': 'direct', 'tickets': 2, 'revenue': Decimal(210)},
+    ])
+    totals = sales.sales_between(cursor, 'Airline 1', date(2025, 3, 17), date(2025, 4, 9))
+
+    assert len(cursor.statements) == 1
+    query, params = cursor.statements[0]
+    assert 'sales_rollup' in query and 'purchases' not in query
+    assert params == ('Airline 1', date(2025, 3, 17), date(2025, 4, 9))
+    assert totals == {
+        '2025-03': {'direct': {'tickets': 4, 'revenue': 400}, 'agent': {'tickets': 1, 'revenue': 90}},
+        '2025-04': {'direct': {'tickets': 2, 'revenue': 210}, 'agent': {'tickets': 0, 'revenue': 0}},
+    }
+
+
+def test_months_before_clamps_to_month_end():
+    assert sales.months_before(date(2025, 3, 31), 1) == date(2025, 2, 28)
+    assert sales.months_before(date(2025, 1, 15), 12) == date(2024, 1, 15)
@@ -0,0 +1,82 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+import app as app_module
+import config
+import snapshot
+
+UPDATED_AT = datetime(2026, 1, 1, 12, 0)
+FLIGHTS = [
+    ('Airline 2', 7, 'JFK', datetime(2026, 3, 1, 9, 0), 'LAX', datetime(2026, 3, 1, 15, 0), Decimal(250), 'upcoming', 3),
+    ('Airline 1', 7, 'JFK', datetime(2026, 3, 1, 8, 0), 'SFO', datetime(2026, 3, 1, 14, 0), Decimal(300), 'delayed', 1),
+    ('Airline 1', 8, 'BOS', datetime(2026, 3, 2, 7, 0), 'JFK', datetime(2026, 3, 2, 8, 30), Decimal(99), 'upcoming', 2),
+]
+
+
+# Answers export()'s two statements: the schedule_version row, then every flight
+class ExportCursor:
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return 4, UPDATED_AT
+
+    def fetchall(self):
+        return list(FLIGHTS)
+
+
+class FixedScheduleVersion:
+    def get(self):
+        return 4, UPDATED_AT
+
+    def invalidate(self):
+        pass
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    flight_snapshots = snapshot.FlightSnapshots(FixedScheduleVersion())
+    flight_snapshots.configure(str(tmp_path), 'db-host', 'airline')
+    snapshot.export(ExportCursor(), flight_snapshots.path, flight_snapshots.digest)
+    return flight_snapshots
+
+
+def test_find_returns_lowest_airline_for_flight_number(snapshots):
+    flight = snapshots.current().find(7)
+
+    assert dict((key, flight[key]) for key in flight.keys()) == {
+        'airline_name': 'Airline 1', 'flight_num': 7, 'departure_airport': 'JFK',
+        'departure_time': datetime(2026, 3, 1, 8, 0), 'arrival_airport': 'SFO',
+        'arrival_time': datetime(2026, 3, 1, 14, 0), 'price': Decimal(300), 'status': 'delayed', 'airplane_id': 1,
+    }
+    assert snapshots.current().find(9) is None
+
+
+def test_snapshot_of_another_database_is_not_used(snapshots, tmp_path):
+    other = snapshot.FlightSnapshots(FixedScheduleVersion())
+    other.configure(str(tmp_path), 'db-host', 'airline')
+    other.digest = snapshot.database_digest('other-host', 'airline')
+
+    assert other._open(other._stamp()) is None
+
+
+def test_flight_details_renders_from_snapshot(snapshots, monkeypatch):
+    app = app_module.app
+    app.config.from_object(config)
+    monkeypatch.setattr(app_module, 'flight_snapshots', snapshots)
+    # The route's conditional-GET decorator holds the app's own ScheduleVersion
+    monkeypatch.setattr(app_module.schedule_version, 'get', FixedScheduleVersion().get)
+
+    def no_database():
+        raise AssertionError('flight_details queried MySQL while the snapshot was current')
+    monkeypatch.setattr(app_module, 'get_db_connection', no_database)
+
+    response = app.test_client().get('/flights/7')
+
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert 'Airline 1 7' in html
+    assert 'SFO at 2026-03-01 14:00:00' in html
+    assert 'action="/purchase_ticket"' in html
+    assert 'name="airline_name" value="Airline 1"' in html
+    assert response.headers['ETag'] == '"schedule-4"'
@@ -0,0 +1,4 @@
+# WSGI entry point for production servers: gunicorn -c gunicorn.conf.py
+from app import create_app
+
+app = application = create_app()